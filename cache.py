@@ -0,0 +1,225 @@
+from collections import OrderedDict
+import hashlib
+import os
+import pickle
+import weakref
+from profiling import get_profile
+from dimensions import INCREMENTAL, merge_changed
+
+
+RESULTS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+MAX_ENTRIES = 64  # number of results kept in memory
+MAX_SIZE = 200 * 1024 * 1024  # approximate number of bytes of the results kept in memory
+FORMAT = 3  # version of the pickled rules, the results saved with other versions aren't read
+
+
+def results_size(results):
+    '''
+    Returns the approximate number of bytes of the results of a dimension (a list of rules or a tuple of lists).
+    '''
+
+    if not isinstance(results, tuple):
+        results = (results,)
+    return sum(128 + 32 * (len(rule.columns) + len(rule.values)) for rules in results for rule in rules)
+
+
+def filter_results(results, min_perc, max_perc):
+    '''
+    Returns a copy of the results with only the rules kept with the minimum and maximum (see Rule.passes).
+    '''
+
+    if not isinstance(results, tuple):
+        return [rule for rule in results if rule.passes(min_perc, max_perc)]
+    return tuple([rule for rule in rules if rule.passes(min_perc, max_perc)] for rules in results)
+
+
+def iter_results(results, min_perc, max_perc):
+    '''
+    Same as filter_results, but with generators of the rules kept instead of lists, so the results aren't copied.
+    '''
+
+    if not isinstance(results, tuple):
+        return (rule for rule in results if rule.passes(min_perc, max_perc))
+    return tuple((rule for rule in rules if rule.passes(min_perc, max_perc)) for rules in results)
+
+
+class ResultCache:
+    '''
+    Cache of the results of the dimensions, by (dataset, dimension, arguments, minimum, maximum).
+
+    Results are kept in memory in a LRU with a maximum number of entries and a maximum size, and also on disk
+    (if folder isn't None) so they survive restarts. The files on disk are a LRU too, by the time they were last
+    used, with the same maximum number of entries and maximum size (the bytes of the files). Since every rule keeps
+    its percentage, results computed with a wider range of percentages are filtered instead of computing the
+    dimension again. The dimensions skip the work of the rules out of their range, so results are never used for a
+    range they don't contain.
+    The rules of the results kept in memory can also be found by their id (see rule).
+    '''
+
+    def __init__(self, folder=RESULTS_FOLDER, max_entries=MAX_ENTRIES, max_size=MAX_SIZE):
+        self.folder = folder
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.size = 0
+        self._results = OrderedDict()  # (dataset, min_perc, max_perc) -> results
+        self._rules = weakref.WeakValueDictionary()  # id -> rule, while the rule is in some results
+
+        if folder is not None:
+            os.makedirs(folder, exist_ok=True)
+
+    def _folder(self, dataset):
+        return os.path.join(self.folder, hashlib.sha1(repr((FORMAT, dataset)).encode()).hexdigest())
+
+    def _remember(self, key, results):
+        if key in self._results:
+            self.size -= results_size(self._results.pop(key))
+
+        self._results[key] = results
+        self.size += results_size(results)
+        for rules in (results if isinstance(results, tuple) else (results,)):
+            for rule in rules:
+                self._rules[rule.id] = rule
+
+        while len(self._results) > 1 and (len(self._results) > self.max_entries or self.size > self.max_size):
+            _, old = self._results.popitem(last=False)
+            self.size -= results_size(old)
+
+    def get(self, dataset, min_perc, max_perc, copy=True):
+        '''
+        Returns the results of dataset (a tuple with the keys of the dataframes, the dimension and its arguments)
+        for the minimum and maximum, or None if they aren't in the cache.
+        The results are a copy, unless copy is False: then they are the results kept in the cache, that must not be
+        changed and may have rules out of the minimum and maximum (see iter_results).
+        '''
+
+        found = filter_results if copy else (lambda results, min_perc, max_perc: results)
+
+        key = (dataset, min_perc, max_perc)
+        if key in self._results:
+            self._results.move_to_end(key)
+            return found(self._results[key], min_perc, max_perc)
+
+        # results of a range that contains this one
+        for (other, low, high), results in reversed(list(self._results.items())):
+            if other == dataset and low <= min_perc and max_perc <= high:
+                self._remember(key, filter_results(results, min_perc, max_perc))
+                return found(self._results[key], min_perc, max_perc)
+
+        if self.folder is not None and os.path.isdir(self._folder(dataset)):
+            for name in os.listdir(self._folder(dataset)):
+                if not name.endswith(".pkl"):
+                    continue
+                low, high = (float(x) for x in name[:-len(".pkl")].split("_"))
+                if low <= min_perc and max_perc <= high:
+                    path = os.path.join(self._folder(dataset), name)
+                    try:
+                        os.utime(path)  # used now, see _evict
+                        with open(path, "rb") as file:
+                            self._remember(key, filter_results(pickle.load(file), min_perc, max_perc))
+                    except FileNotFoundError:  # removed by _evict in another thread
+                        continue
+                    return found(self._results[key], min_perc, max_perc)
+
+        return None
+
+    def put(self, dataset, min_perc, max_perc, results):
+        '''
+        Keeps the results of dataset for the minimum and maximum.
+        '''
+
+        self._remember((dataset, min_perc, max_perc), filter_results(results, min_perc, max_perc))
+
+        if self.folder is not None:
+            os.makedirs(self._folder(dataset), exist_ok=True)
+            path = os.path.join(self._folder(dataset), str(float(min_perc)) + "_" + str(float(max_perc)) + ".pkl")
+            with open(path + ".tmp", "wb") as file:
+                pickle.dump(results, file)
+            os.replace(path + ".tmp", path)
+            self._evict()
+
+    def _evict(self):
+        '''
+        Removes the files of the results used the longest time ago while there are more than max_entries or they
+        take more than max_size bytes. The last results saved are always kept.
+        '''
+
+        files = []
+        for folder in os.listdir(self.folder):
+            folder = os.path.join(self.folder, folder)
+            if os.path.isdir(folder):
+                for name in os.listdir(folder):
+                    if name.endswith(".pkl"):
+                        stat = os.stat(os.path.join(folder, name))
+                        files.append((stat.st_mtime, stat.st_size, folder, name))
+
+        files.sort()
+        size = sum(file[1] for file in files)
+        while len(files) > 1 and (len(files) > self.max_entries or size > self.max_size):
+            _, file_size, folder, name = files.pop(0)
+            size -= file_size
+            os.remove(os.path.join(folder, name))
+            if not os.listdir(folder):
+                os.rmdir(folder)
+
+    def rule(self, rule_id):
+        '''
+        Returns the rule with the id (see Rule.id) from the results kept in memory, or None if it isn't there.
+        If the same rule was generated for several datasets, the one of the latest results is returned.
+        '''
+
+        return self._rules.get(rule_id)
+
+    def dataset(self, dimension, dataframes, args=(), options=None):
+        '''
+        Returns the key of the results of the dimension (a function or its name) for the dataframes and arguments.
+        options are other settings that change the results (for example, the sampling of the rows).
+        '''
+
+        name = dimension if isinstance(dimension, str) else dimension.__name__
+        dataset = tuple(get_profile(dataframe).key for dataframe in dataframes), name, tuple(args)
+        if options:
+            dataset += (tuple(sorted(options.items())),)
+        return dataset
+
+    def parent(self, dimension, dataframes, min_perc, max_perc, args=(), options=None):
+        '''
+        If the dataframe is a version made by changing some columns of another one (see DatasetStore.put) and the
+        results of the dimension for that version are in the cache, returns (those results, changed columns), so
+        only the rules about the changed columns are generated again (see dimensions.merge_changed).
+        Returns None otherwise.
+        '''
+
+        name = dimension if isinstance(dimension, str) else dimension.__name__
+        if name not in INCREMENTAL or len(dataframes) != 1 or options or (name == "uniqueness" and args[:1] not in
+                                                                          ((), (2,))):
+            return None
+
+        profile = get_profile(dataframes[0])
+        if profile.parent is None:
+            return None
+
+        results = self.get(((profile.parent,), name, tuple(args)), min_perc, max_perc)
+        if results is None:
+            return None
+        return results, profile.changed
+
+    def compute(self, dimension, dataframes, min_perc, max_perc, *args):
+        '''
+        Returns dimension(*dataframes, *args, min_perc, max_perc) for the arguments used by each dimension
+        (relevancy receives the two dataframes and the table names), computing it only if it isn't in the cache.
+        The results of a version with a few changed columns are made from the results of the previous version.
+        '''
+
+        dataset = self.dataset(dimension, dataframes, args)
+
+        results = self.get(dataset, min_perc, max_perc)
+        if results is None:
+            parent = self.parent(dimension, dataframes, min_perc, max_perc, args)
+            if parent is not None:
+                changed_results = dimension(*dataframes, *args, min_perc, max_perc, only=parent[1])
+                results = merge_changed(parent[0], changed_results, list(dataframes[0].columns), parent[1])
+            else:
+                results = dimension(*dataframes, *args, min_perc, max_perc)
+            self.put(dataset, min_perc, max_perc, results)
+            results = filter_results(results, min_perc, max_perc)
+        return results
@@ -1,8 +1,29 @@
 
 from sklearn.neural_network import MLPClassifier
-
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.dummy import DummyClassifier
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import make_pipeline
+from sklearn.impute import SimpleImputer
+
+import time
+import numpy as np
 import pandas as pd
-from sklearn.preprocessing import LabelEncoder
+from scipy import sparse
+from sklearn.preprocessing import LabelEncoder, MaxAbsScaler
+from models import Imputer
+
+
+MODEL_OPTIONS = {"random_state": 1, "max_iter": 300}  # options of the MLPClassifier that predicts the values
+IMPUTER = "mlp"  # backend of the models (see IMPUTERS), or "auto"
+ACCURACY_TARGET = 0.9  # accuracy in the holdout of the pass data that the "auto" backend looks for
+HOLDOUT = 0.2  # part of the pass data kept to measure the accuracy of the backends
+KNN_NEIGHBORS = 5
+MAX_CATEGORIES = 1000  # categories of a column with their own feature, the less frequent ones share one feature
+ENCODING = "sparse one-hot encoding"  # encoding of the columns used to train the models
+ENCODING_OPTIONS = {"max_categories": MAX_CATEGORIES, "n_features": None}  # options of sparse_encoding
 
 
 ################### LABEL ENCODING #######################
@@ -32,14 +53,135 @@ def one_hot_encoding(dataframe, column):
 
 
 
+################### SPARSE ENCODING ######################
+
+class Encoding:
+    '''
+    Sparse design matrix of a dataframe (see sparse_encoding): matrix (scipy csr) has one line per row of the
+    dataframe and one column per feature (names), and label has the values of the column to predict, not encoded.
+    columns has the features of each column of the dataframe: a range, or the rows and features of its values if
+    they are hashed, and numeric has the columns that aren't one-hot encoded.
+    '''
+
+    def __init__(self, matrix, names, label, columns=None, numeric=()):
+        self.matrix = matrix
+        self.names = names
+        self.label = label
+        self.columns = columns if columns is not None else {}
+        self.numeric = set(numeric)
+
+    def for_label(self, label):
+        '''
+        Returns the Encoding without the features of the column to predict (label is its Series), the same as
+        encoding the dataframe with that label, so the encoding of all the columns is shared by many rules.
+        '''
+
+        features = self.columns.get(label.name)
+        matrix, names = self.matrix, self.names
+        columns = {column: other for column, other in self.columns.items() if column != label.name}
+
+        if isinstance(features, range):
+            kept = np.r_[0:features.start, features.stop:len(names)]
+            matrix, names = matrix[:, kept], [names[i] for i in kept]
+            for column, other in columns.items():
+                if isinstance(other, range) and other.start >= features.stop:
+                    columns[column] = range(other.start - len(features), other.stop - len(features))
+        elif features is not None:
+            # hashed values share their features with other columns, so they are subtracted
+            rows, hashed = features
+            matrix = matrix - sparse.csr_matrix((np.ones(len(rows)), (rows, hashed)), shape=matrix.shape)
+            matrix.eliminate_zeros()
+
+        return Encoding(matrix, names, label, columns, self.numeric - {label.name})
+
+    def blocks(self):
+        '''
+        Returns the features of each column and if it's numeric (see OrdinalCodes), or None if the values are hashed.
+        '''
+
+        if not all(isinstance(features, range) for features in self.columns.values()):
+            return None
+        return [(features, column in self.numeric) for column, features in self.columns.items()]
+
+
+def sparse_encoding(dataframe, label=None, max_categories=None, n_features=None):
+    '''
+    Encodes all the columns but label (all of them if it's None) in one sparse matrix, in a single pass over the
+    columns and without copying the dataframe: numeric columns are kept as they are and the other columns are
+    one-hot encoded, with the features in the same order as encode_all_labels with "one-hot encoding".
+    With max_categories, only the max_categories most frequent categories of a column have their own feature and
+    the others share one (column=*). With n_features, the categories of all the columns are hashed into n_features
+    features (the hashing trick), so the number of features doesn't depend on the number of categories.
+    Returns an Encoding.
+    '''
+
+    n_rows = len(dataframe)
+    numeric_columns = dataframe.select_dtypes(include=['int64','float64']).columns
+    rows, features, data, names = [], [], [], []
+    columns = {}
+
+    for column in dataframe.columns:
+        if column != label and column in numeric_columns:
+            columns[column] = range(len(names), len(names) + 1)
+            rows.append(np.arange(n_rows))
+            features.append(np.full(n_rows, len(names)))
+            data.append(dataframe[column].to_numpy(dtype=float))
+            names.append(column)
+
+    offset = len(names)
+    if n_features is not None:
+        names += ["hash " + str(i) for i in range(n_features)]
+
+    for column in dataframe.columns:
+        if column == label or column in numeric_columns:
+            continue
+
+        codes, categories = pd.factorize(dataframe[column], sort=True)  # missing values have no feature
+        start = len(names)
+
+        if n_features is not None:
+            keys = np.array([str(column) + "=" + str(category) for category in categories], dtype=object)
+            mapping = offset + (pd.util.hash_array(keys) % np.uint64(n_features)).astype(np.int64)
+        elif max_categories is not None and len(categories) > max_categories:
+            counts = np.bincount(codes[codes != -1], minlength=len(categories))
+            kept = np.sort(np.argsort(-counts, kind="stable")[:max_categories])
+            mapping = np.full(len(categories), len(names) + max_categories)  # the shared feature, after the kept ones
+            mapping[kept] = len(names) + np.arange(max_categories)
+            names += list(categories[kept]) + [str(column) + "=*"]
+        else:
+            mapping = len(names) + np.arange(len(categories))
+            names += list(categories)
+
+        present = np.flatnonzero(codes != -1)
+        rows.append(present)
+        features.append(mapping[codes[present]])
+        data.append(np.ones(len(present)))
+        columns[column] = (present, features[-1]) if n_features is not None else range(start, len(names))
+
+    matrix = sparse.csr_matrix((np.concatenate(data) if data else np.zeros(0),
+                                (np.concatenate(rows) if rows else np.zeros(0, dtype=int),
+                                 np.concatenate(features) if features else np.zeros(0, dtype=int))),
+                               shape=(n_rows, len(names)))
+    matrix.eliminate_zeros()
+
+    return Encoding(matrix, names, dataframe[label] if label in dataframe.columns else None, columns,
+                    [column for column in numeric_columns if column != label])
+
+
+
 ################### APPLY ENCODING #######################
 
-def encode_all_labels(df, label, option="one-hot encoding"):
+def encode_all_labels(df, label, option="one-hot encoding", **options):
     '''
-    Applies the function label_encondig or one_hot_enconding (according to the chosen option), to encode all non-numeric columns.
-    Options: "label encoding" or "one-hot encoding"
+    Applies the function label_encondig or one_hot_enconding (according to the chosen option), to encode all
+    non-numeric columns.
+    Options: "label encoding", "one-hot encoding" or "sparse one-hot encoding" (returns an Encoding, see
+    sparse_encoding, that receives the other options)
     '''
 
+    if option == "sparse one-hot encoding":
+        return sparse_encoding(df, label, **options)
+
     data = df.copy(deep=True)
     non_numeric_columns = data.select_dtypes(exclude=['int64','float64']).columns
     if label in non_numeric_columns:
@@ -51,8 +193,12 @@ def encode_all_labels(df, label, option="one-hot encoding"):
             data = label_encoding(data, column)
 
     elif option == "one-hot encoding":
-        for column in non_numeric_columns:
-            data = one_hot_encoding(data, column)
+        # all the columns at once: the categories are named by their value, as in one_hot_encoding, so a category
+        # with the name of another column (or of a category of another column) is an error, as in its join
+        data = pd.get_dummies(data, columns=list(non_numeric_columns), prefix='', prefix_sep='')
+        overlap = data.columns[data.columns.duplicated()].unique()
+        if len(overlap) > 0:
+            raise ValueError("columns overlap but no suffix specified: " + str(overlap))
 
     else:
         print("\nInvalid encoding!\n")
@@ -62,129 +208,366 @@ def encode_all_labels(df, label, option="one-hot encoding"):
 
 
 
-################## IDEA TO TREAT THE GENERATED RULES ###############################
-import numpy as np
-import re
+################### IMPUTER BACKENDS ######################
+
+class OrdinalCodes(BaseEstimator, TransformerMixin):
+    '''
+    Turns lines of a sparse Encoding back into one column for each column of the dataframe (the numeric ones as
+    they are, the others the number of the category, NaN if missing), for the models that don't take sparse data.
+    blocks are the features of each column (see Encoding.blocks).
+    '''
+
+    def __init__(self, blocks):
+        self.blocks = blocks
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X):
+        X = sparse.csc_matrix(X)
+        codes = np.full((X.shape[0], len(self.blocks)), np.nan)
+
+        for j, (features, numeric) in enumerate(self.blocks):
+            block = X[:, features.start:features.stop]
+            if numeric:
+                codes[:, j] = block.toarray()[:, 0]
+            else:
+                block = block.tocoo()  # at most one value in each row
+                codes[block.row, j] = block.col
+
+        return codes
+
 
+def most_frequent(blocks):
+    # the pass data of a rule is already its conditioning group (for example, the rows where country is PT)
+    return DummyClassifier(strategy="most_frequent")
+
+
+def fill_missing():
+    # missing numeric values (NaN) are replaced by the mean of the column, for the models that don't take them
+    return SimpleImputer(strategy="mean", keep_empty_features=True)
+
+
+def k_nearest(blocks):
+    return make_pipeline(fill_missing(), MaxAbsScaler(), KNeighborsClassifier(n_neighbors=KNN_NEIGHBORS))
+
+
+def hist_gradient_boosting(blocks):
+    if blocks is None:  # the hashed values can't be turned back into categories
+        return None
+    categorical = [not numeric and len(features) < 255 for features, numeric in blocks]  # at most max_bins - 1
+    return make_pipeline(OrdinalCodes(blocks),
+                         HistGradientBoostingClassifier(categorical_features=categorical, early_stopping=False,
+                                                        random_state=1))
+
+
+def mlp(blocks):
+    return make_pipeline(fill_missing(), MLPClassifier(**MODEL_OPTIONS))
+
+
+# backends of the models, in the order "auto" tries them (see train_imputer): functions that return a new model for
+# the blocks of an Encoding (see Encoding.blocks) or None if they can't use that encoding
+IMPUTERS = {"most-frequent": most_frequent,
+            "knn": k_nearest,
+            "hist-gradient-boosting": hist_gradient_boosting,
+            "mlp": mlp}
+
+
+def evaluate_imputer(backend, blocks, X_pass_data, Y_pass_data, holdout=HOLDOUT):
+    '''
+    Trains a backend (its name) with part of the pass data and measures it with the rest (holdout). Returns a
+    dictionary with the training and prediction times (seconds) and the accuracy (None if there is too few data),
+    or None if the backend can't be used with the blocks.
+    '''
+
+    model = IMPUTERS[backend](blocks)
+    if model is None:
+        return None
+    if X_pass_data.shape[0] * holdout < 1:
+        return {"backend": backend, "fit_time": None, "predict_time": None, "accuracy": None}
+
+    X_train, X_test, Y_train, Y_test = train_test_split(X_pass_data, Y_pass_data, test_size=holdout, random_state=1)
+
+    start = time.perf_counter()
+    model.fit(X_train, Y_train)
+    fitted = time.perf_counter()
+    predictions = model.predict(X_test)
+    predicted = time.perf_counter()
+
+    return {"backend": backend, "fit_time": fitted - start, "predict_time": predicted - fitted,
+            "accuracy": float(np.mean(predictions == Y_test.to_numpy()))}
+
+
+def benchmark_imputers(X_pass_data, Y_pass_data, blocks=None, backends=None, target=None):
+    '''
+    Evaluates the backends (all of them by default, in the order of IMPUTERS) with the pass data of a rule (see
+    evaluate_imputer) and returns their reports. The backends that can't use the blocks are skipped. With a target
+    accuracy, it stops at the first one that reaches it.
+    '''
+
+    report = []
+    for backend in backends or IMPUTERS:
+        result = evaluate_imputer(backend, blocks, X_pass_data, Y_pass_data)
+        if result is None:
+            continue
+        report.append(result)
+        if target is not None and result["accuracy"] is not None and result["accuracy"] >= target:
+            break
+    return report
+
+
+
+################## IDEA TO TREAT THE GENERATED RULES ###############################
 
 def get_values_consistency(generated_rule):
     '''
-    Divides a rule into a tuple with only the relevant info. "When country is PT then city is Braga or Porto" -> (country, PT, city, [Braga,Porto])
+    Returns the relevant info of a CONS1 rule (dimensions.Rule).
+    "When country is PT then city is Braga or Porto" -> (country, PT, city, [Braga,Porto])
     '''
-    l = re.split(',|, | |: ', generated_rule) # break rule into words
-    ises = [i for i in range(len(l)) if l[i]=="is"]
-    # Get only relevant words:
-    column1 = l[1]
-    value1 = l[3]
-    column2 = l[5]
-    values2 = l[ises[-1]+1:len(l)-1]
-    values2 = [x for x in values2 if x!='or']
+    if generated_rule.rule_type != "CONS1":
+        raise ValueError("not a consistency rule: " + str(generated_rule))
+    column1, column2 = generated_rule.columns
+    value1 = generated_rule.values[0]
+    values2 = list(generated_rule.values[1:])
     return column1, value1, column2, values2
 
 
 
-def get_pass_and_fail_data(dataframe, value1, column, value2):
+def get_pass_and_fail_data(encoding, rows, passed):
     '''
-    Divides the dataframe in 4 dataframes: X_pass_data,Y_pass_data, X_fail_data, Y_fail_data
+    Divides the rows of the encoding (Encoding) where rows is True in 4 parts: X_pass_data,Y_pass_data,
+    X_fail_data, Y_fail_data
+    The pass data are the rows where passed is True. X are sparse matrices (lines of encoding.matrix) and Y are
+    the values of the label, with the index of the dataframe.
     '''
 
-    label_to_predict = column
+    rows = np.asarray(rows, dtype=bool)
+    passed = np.asarray(passed, dtype=bool)
 
-    df = dataframe.copy(deep=True)
-    df = df[df[value1]==1] # df is one hot encoded, so we have to check if the value1 it is equal to 1
+    X_pass_data = encoding.matrix[rows & passed]
+    Y_pass_data = encoding.label[rows & passed]
 
-    # we want to predict column, that it is not one-hot encoded:
-    pass_data = df[df[column].isin(value2)]
-    fail_data = df[~df[column].isin(value2)] # ~ = not
+    X_fail_data = encoding.matrix[rows & ~passed] # ~ = not
+    Y_fail_data = encoding.label[rows & ~passed]
 
-    X_pass_data = pass_data.drop([label_to_predict],axis=1)
-    Y_pass_data = pass_data[label_to_predict]
+    return X_pass_data,Y_pass_data, X_fail_data, Y_fail_data
 
-    X_fail_data = fail_data.drop([label_to_predict],axis=1)
-    Y_fail_data = fail_data[label_to_predict]
 
-    return X_pass_data,Y_pass_data, X_fail_data, Y_fail_data
 
 
+def train_imputer(X_pass_data, Y_pass_data, X_fail_data, fail_rows, backend=IMPUTER, blocks=None):
+    '''
+    Trains the model with the pass data and predicts the values of the fail data (the models receive the sparse
+    matrices as they are). fail_rows are the positions (from 0) of the fail data in the dataframe and blocks the
+    features of each column (see Encoding.blocks). The model is one of IMPUTERS, or with "auto", the first one in
+    the order of IMPUTERS that reaches ACCURACY_TARGET in the holdout of the pass data (the most accurate if none
+    does). A backend that can't use the blocks (hist-gradient-boosting with hashed features) is replaced by the
+    default one, IMPUTER. Returns an Imputer.
+    '''
+
+    if X_fail_data.shape[0] == 0:  # the rule has no fail data, there is nothing to predict
+        return Imputer(None, np.asarray(fail_rows), np.array([], dtype=object), backend)
+
+    report = []
+    if backend == "auto":
+        report = benchmark_imputers(X_pass_data, Y_pass_data, blocks, target=ACCURACY_TARGET)
+        backend = max(report, key=lambda result: result["accuracy"] or 0)["backend"]  # the last one reached it, if any
+
+    clf = IMPUTERS[backend](blocks)
+    if clf is None:
+        backend = IMPUTER
+        clf = IMPUTERS[backend](blocks)
 
+    start = time.perf_counter()
+    clf.fit(X_pass_data, Y_pass_data)
+    fitted = time.perf_counter()
 
-def cleansing_consistency(dataframe, rule_to_apply):
+    predictions = clf.predict(X_fail_data)
+
+    report.append({"backend": backend, "fit_time": fitted - start, "predict_time": time.perf_counter() - fitted,
+                   "accuracy": None, "chosen": True})
+
+    return Imputer(clf, np.asarray(fail_rows), np.array(predictions), backend, report)
+
+
+def cached_imputer(models, dataset, rule, train, backend=IMPUTER):
     '''
-    Receives dataframe and the rule chosen by the user (example: rule 27 - WHEN COUNTRY IS PT THEN CITY IS BRAGA or PORTO)
-    Returns a dataframe that only has the fail data and the forecasts, and the original updated dataframe
+    Returns the imputer of the rule from the cache of models (models.ModelCache) for the dataset (dataset id,
+    version), or trains it with train() and keeps it. Without a cache (models or dataset is None) it's always trained.
     '''
 
-    df = dataframe.copy(deep=True)
-    df = df.replace(" ","blank")
+    if models is None or dataset is None:
+        return train()
 
-    c1, v1, c2, v2 = get_values_consistency(rule_to_apply)
-    label_to_predict = c2
+    key = model_key(models, dataset, rule, backend)
+    imputer = models.get(key)
+    if imputer is None:
+        imputer = train()
+        models.put(key, imputer)
+    return imputer
 
-    df = encode_all_labels(df, label_to_predict)
 
-    X_pass_data,Y_pass_data, X_fail_data, Y_fail_data = get_pass_and_fail_data(df, v1, c2, v2)
+def model_key(models, dataset, rule, backend=IMPUTER):
+    options = dict(MODEL_OPTIONS, imputer=backend, target=ACCURACY_TARGET, holdout=HOLDOUT)
+    return models.key(dataset, rule, (ENCODING, tuple(sorted(ENCODING_OPTIONS.items()))), options)
 
 
-    clf = MLPClassifier(random_state=1, max_iter=300).fit(X_pass_data, Y_pass_data)
+def predicted_rows(dataframe, imputer):
+    '''
+    Returns a dataframe that only has the fail data and the forecasts (column PRED).
+    '''
 
-    predictions = clf.predict(X_fail_data)
+    res = dataframe.iloc[imputer.rows]
 
-    nifs = X_fail_data['NIF']
-    res = dataframe[dataframe['NIF'].isin(nifs)]
+    res.insert(len(res.columns),"PRED",imputer.predictions)
 
-    res.insert(len(res.columns),"PRED",np.array(predictions))
+    return res
 
 
-    # create this copy otherwise it spoils the original
-    altered_dataframe = dataframe.copy(deep=True)
+def write_predictions(dataframe, predictions):
+    '''
+    Returns a copy of the dataframe with the predictions written in their rows: predictions is a list of
+    (column, positions, values). Only the changed columns are copied, the others are shared with the dataframe.
+    '''
 
-    altered_dataframe.loc[altered_dataframe['NIF'].isin(res['NIF']), [label_to_predict]] = res['PRED']
+    altered_dataframe = dataframe.copy(deep=False)
+    columns = {}
 
-    return res, altered_dataframe
+    for column, positions, values in predictions:
+        if column not in columns:
+            # create this copy otherwise it spoils the original
+            columns[column] = altered_dataframe[column].copy()
+        columns[column].iloc[positions] = values
 
+    for column, values in columns.items():
+        altered_dataframe[column] = values  # replaces the column of the copy only
 
+    return altered_dataframe
 
 
-def get_values_completeness(generated_rule):
+def apply_imputer(dataframe, imputer, label_to_predict):
     '''
-    Divides a rule into a tuple with only the relevant info. "NIF is populated: 100.0%" -> NIF
+    Returns a dataframe that only has the fail data and the forecasts, and the original updated dataframe.
     '''
-    l = re.split(',|, | |: |%', generated_rule) # break rule into words
-    return l[0]
 
+    res = predicted_rows(dataframe, imputer)
+
+    altered_dataframe = write_predictions(dataframe, [(label_to_predict, imputer.rows, imputer.predictions)])
 
-def cleansing_completeness(dataframe, rule_to_apply):
+    return res, altered_dataframe
+
+
+def _cleansing(dataframe, rule_to_apply, models=None, dataset=None, backend=IMPUTER):
     '''
-    Receives dataframe and the rule chosen by the user (example: "NIF is populated")
+    Trains (or reuses) the model that fixes the rows that don't follow a COMP1 or CONS1 rule, see
+    cleansing_completeness and cleansing_consistency.
+    '''
+
+    label_to_predict, rows, passed = rule_split(dataframe, rule_to_apply)
+
+    def train():
+        df = dataframe.copy(deep=True)
+        df = df.replace(" ","blank")
+
+        encoding = encode_all_labels(df, label_to_predict, ENCODING, **ENCODING_OPTIONS)
+
+        X_pass_data,Y_pass_data, X_fail_data, Y_fail_data = get_pass_and_fail_data(encoding, rows, passed)
+
+        return train_imputer(X_pass_data, Y_pass_data, X_fail_data, np.flatnonzero(rows & ~passed), backend,
+                             encoding.blocks())
+
+    imputer = cached_imputer(models, dataset, rule_to_apply, train, backend)
+
+    return apply_imputer(dataframe, imputer, label_to_predict)
+
+
+def cleansing_consistency(dataframe, rule_to_apply, models=None, dataset=None, backend=IMPUTER):
+    '''
+    Receives dataframe and the rule chosen by the user
+    (example: rule 27 - WHEN COUNTRY IS PT THEN CITY IS BRAGA or PORTO)
     Returns a dataframe that only has the fail data and the forecasts, and the original updated dataframe
+    If models (models.ModelCache) and dataset (dataset id, version) are given, the trained model is reused.
+    backend is the kind of model (see train_imputer).
     '''
-    df = dataframe.copy(deep=True)
-    df = df.replace(" ","blank")
 
-    label_to_predict = get_values_completeness(rule_to_apply)
+    return _cleansing(dataframe, rule_to_apply, models, dataset, backend)
 
-    df = encode_all_labels(df, label_to_predict)
 
-    pass_data = df[df[label_to_predict] != "blank"]
-    fail_data = df[df[label_to_predict] == "blank"] 
 
-    X_pass_data = pass_data.drop([label_to_predict],axis=1)
-    Y_pass_data = pass_data[label_to_predict]
 
-    X_fail_data = fail_data.drop([label_to_predict],axis=1)
+def get_values_completeness(generated_rule):
+    '''
+    Returns the relevant info of a COMP1 rule (dimensions.Rule). "NIF is populated: 100.0%" -> NIF
+    '''
+    if generated_rule.rule_type != "COMP1":
+        raise ValueError("not a completeness rule: " + str(generated_rule))
+    return generated_rule.columns[0]
 
-    clf = MLPClassifier(random_state=1, max_iter=300).fit(X_pass_data, Y_pass_data)
 
-    predictions = clf.predict(X_fail_data)
+def cleansing_completeness(dataframe, rule_to_apply, models=None, dataset=None, backend=IMPUTER):
+    '''
+    Receives dataframe and the rule chosen by the user (example: "NIF is populated")
+    Returns a dataframe that only has the fail data and the forecasts, and the original updated dataframe
+    If models (models.ModelCache) and dataset (dataset id, version) are given, the trained model is reused.
+    backend is the kind of model (see train_imputer).
+    '''
 
-    nifs = X_fail_data['NIF']
-    res = dataframe[dataframe['NIF'].isin(nifs)]
+    return _cleansing(dataframe, rule_to_apply, models, dataset, backend)
 
-    res.insert(len(res.columns),"PRED",np.array(predictions))
 
-    # create this copy otherwise it spoils the original
-    altered_dataframe = dataframe.copy(deep=True)
 
-    altered_dataframe.loc[altered_dataframe['NIF'].isin(res['NIF']), [label_to_predict]] = res['PRED']
+def rule_split(dataframe, rule):
+    '''
+    Returns the column to predict to fix a COMP1 or CONS1 rule (dimensions.Rule), the rows of the dataframe the
+    rule is about and the ones that pass it (boolean arrays). Blank values (" ") don't pass a COMP1 rule.
+    '''
 
-    return res, altered_dataframe
+    if rule.rule_type == "COMP1":
+        label = get_values_completeness(rule)
+        return label, np.ones(len(dataframe), dtype=bool), ~dataframe[label].isin([" ", "blank"]).to_numpy()
+
+    # the rows where column1 has value1, that pass if column2 has one of values2
+    c1, v1, c2, v2 = get_values_consistency(rule)
+    return c2, (dataframe[c1] == v1).to_numpy(), dataframe[c2].isin(v2).to_numpy()
+
+
+def cleansing_batch(dataframe, rules, models=None, dataset=None, executor=None, backend=IMPUTER):
+    '''
+    Applies many COMP1 and CONS1 rules (dimensions.Rule) at once. The dataframe is encoded once for all the rules,
+    and the models that aren't in the cache (models and dataset as in cleansing_completeness) are trained at the
+    same time in executor (a concurrent.futures executor, for example a process pool) or one after the other if
+    executor is None. backend is the kind of model (see train_imputer).
+    Returns a list with the dataframe of the fail data and the forecasts of each rule, and the original dataframe
+    updated with the forecasts of all the rules (if two rules change the same value, the last one is kept).
+    '''
+
+    splits = [rule_split(dataframe, rule) for rule in rules]
+    imputers = [None] * len(rules)
+    if models is not None and dataset is not None:
+        imputers = [models.get(model_key(models, dataset, rule, backend)) for rule in rules]
+
+    missing = [i for i, imputer in enumerate(imputers) if imputer is None]
+    if missing:
+        df = dataframe.replace(" ","blank")
+        encoding = encode_all_labels(df, None, ENCODING, **ENCODING_OPTIONS)
+
+        trained = {}
+        for i in missing:
+            label, rows, passed = splits[i]
+            rule_encoding = encoding.for_label(df[label])
+            X_pass_data,Y_pass_data, X_fail_data, Y_fail_data = get_pass_and_fail_data(rule_encoding, rows, passed)
+            task = (X_pass_data, Y_pass_data, X_fail_data, np.flatnonzero(rows & ~passed), backend,
+                    rule_encoding.blocks())
+            trained[i] = train_imputer(*task) if executor is None else executor.submit(train_imputer, *task)
+
+        for i in missing:
+            imputers[i] = trained[i] if executor is None else trained[i].result()
+            if models is not None and dataset is not None:
+                models.put(model_key(models, dataset, rules[i], backend), imputers[i])
+
+    changes = [predicted_rows(dataframe, imputer) for imputer in imputers]
+    altered_dataframe = write_predictions(dataframe, [(label_to_predict, imputer.rows, imputer.predictions)
+                                                      for (label_to_predict, rows, passed), imputer
+                                                      in zip(splits, imputers)])
+
+    return changes, altered_dataframe
@@ -0,0 +1,258 @@
+from collections import OrderedDict
+import os
+import pickle
+import re
+import shutil
+import uuid
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+from pyarrow import feather
+from profiling import register_key, StreamProfile, common_dtype
+
+
+DATA_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "datasets")
+FRAME_CACHE_SIZE = 4  # number of decoded dataframes kept in memory
+CHUNK_ROWS = 100000  # number of rows of each partition of a csv file that is read in chunks
+
+
+def frame_delta(old, new):
+    '''
+    Returns the columns with values that changed from the dataframe old to new, or None if they don't have the
+    same columns and number of rows.
+    '''
+
+    if list(old.columns) != list(new.columns) or len(old) != len(new):
+        return None
+
+    changed = []
+    for column in new.columns:
+        before, after = old[column].to_numpy(), new[column].to_numpy()
+        if old[column].dtype != new[column].dtype or not ((before == after) | (pd.isna(before) & pd.isna(after))).all():
+            changed.append(column)
+    return changed
+
+
+def csv_dtypes(file, chunksize=CHUNK_ROWS):
+    '''
+    Returns the dtype of each column of a csv file, for reading it in chunks with the same dtypes as when the whole
+    file is read at once: the dtypes of the chunks are widened (see profiling.common_dtype), and the columns that
+    aren't numbers or booleans are read as text. Booleans with missing values are objects (True, False and NaN),
+    that no dtype of read_csv gives: their dtype is object, and they are read without a dtype and converted
+    (see put_csv).
+    '''
+
+    dtypes, booleans = {}, {}
+    for chunk in pd.read_csv(file, chunksize=chunksize):
+        for column in chunk.columns:
+            series = chunk[column]
+            dtypes[column] = common_dtype(dtypes.get(column), series.dtype)
+            boolean = series.dtype == bool or series.isna().all() \
+                or (series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) == "boolean")
+            booleans[column] = booleans.get(column, True) and boolean
+
+    def read_as(column, dtype):
+        if dtype.kind in "iufb":
+            return dtype
+        return object if booleans[column] else str
+
+    return {column: read_as(column, dtype) for column, dtype in dtypes.items()}
+
+
+class DatasetStore:
+    '''
+    Keeps the uploaded datasets on the local disk, one Arrow file for each version of a dataset (or a pickle file,
+    for dataframes that can't be converted to Arrow), so the session only carries the dataset id and the version.
+    The files are memory-mapped when they are read, and the most recently used dataframes are kept decoded in
+    memory.
+    '''
+
+    def __init__(self, folder=DATA_FOLDER, cache_size=FRAME_CACHE_SIZE):
+        self.folder = folder
+        self.cache_size = cache_size
+        self._frames = OrderedDict()
+        os.makedirs(folder, exist_ok=True)
+
+    def path(self, dataset_id, version, extension="arrow"):
+        '''
+        Returns the path of the file of a version of a dataset (without extension if extension is None).
+        '''
+
+        if not re.fullmatch(r"[0-9a-f]{32}", str(dataset_id)):  # the id comes from the session
+            raise KeyError(dataset_id)
+        name = "v" + str(int(version))
+        return os.path.join(self.folder, dataset_id, name if extension is None else name + "." + extension)
+
+    def versions(self, dataset_id):
+        '''
+        Returns the versions of a dataset that are stored.
+        '''
+
+        folder = os.path.dirname(self.path(dataset_id, 0))
+        if not os.path.isdir(folder):
+            return []
+        return sorted({int(name[1:].split(".")[0]) for name in os.listdir(folder)
+                       if name.startswith("v") and not name.endswith(".delta")})
+
+    def _new_version(self, dataset_id):
+        if dataset_id is None:
+            dataset_id = uuid.uuid4().hex
+        version = max(self.versions(dataset_id), default=0) + 1
+        os.makedirs(os.path.dirname(self.path(dataset_id, version)), exist_ok=True)
+        return dataset_id, version
+
+    def _write(self, dataframe, path):
+        '''
+        Writes the dataframe to path.arrow, or to path.pkl if it can't be converted to Arrow.
+        '''
+
+        dataframe = dataframe.reset_index(drop=True)
+        try:
+            # a single record batch: the columns of several batches are copied when they are read
+            feather.write_feather(dataframe, path + ".arrow", compression="uncompressed",
+                                  chunksize=max(1, len(dataframe)))
+        except (TypeError, ValueError):  # columns with values of different types can't be converted to Arrow
+            if os.path.exists(path + ".arrow"):
+                os.remove(path + ".arrow")
+            dataframe.to_pickle(path + ".pkl")
+
+    def _read(self, path):
+        '''
+        Reads a file written by _write (path with the extension).
+        '''
+
+        if not path.endswith(".arrow"):
+            return pd.read_pickle(path)
+
+        # without consolidating the columns in blocks, numeric columns without missing values are read
+        # directly from the memory-mapped file (shared by all the processes that read the same version)
+        dataframe = feather.read_table(path, memory_map=True).to_pandas(split_blocks=True)
+        for column in dataframe.columns:  # Arrow gives None for missing text values, pandas uses NaN
+            if dataframe[column].dtype == object:
+                dataframe[column] = dataframe[column].fillna(np.nan)
+        return dataframe
+
+    def put(self, dataframe, dataset_id=None, parent=None):
+        '''
+        Stores the dataframe as a new dataset (or as a new version of dataset_id) and returns (dataset_id, version).
+        If the dataframe was made by changing values of the version parent of dataset_id, the changed columns are
+        kept too (see delta), so the rules of the parent about the other columns are reused (see
+        dimensions.merge_changed).
+        '''
+
+        dataset_id, version = self._new_version(dataset_id)
+        self._write(dataframe, self.path(dataset_id, version, None))
+
+        if parent is not None:
+            columns = frame_delta(self.get(dataset_id, parent), dataframe)
+            if columns is not None:
+                with open(self.path(dataset_id, version, "delta"), "wb") as file:
+                    pickle.dump({"parent": int(parent), "columns": columns}, file)
+
+        return dataset_id, version
+
+    def delta(self, dataset_id, version):
+        '''
+        Returns the changes of a version from the version it was made from: a dictionary with the parent version and
+        the columns with changed values, or None if the version wasn't made from another one.
+        '''
+
+        path = self.path(dataset_id, version, "delta")
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as file:
+            return pickle.load(file)
+
+    def put_csv(self, file, dataset_id=None, chunksize=CHUNK_ROWS):
+        '''
+        Reads a csv file in chunks of chunksize rows and stores it as a new dataset (or as a new version of
+        dataset_id), one partition for each chunk that are then joined (see _join), so the file is never in memory
+        at once. The file is read twice: first to find the dtypes of the columns (see csv_dtypes), so all the
+        chunks have the same dtypes, and then to store it. file is a path or a file object that can be rewound.
+        Returns (dataset_id, version, summary), with the summary of the columns (profiling.StreamProfile)
+        computed while reading.
+        '''
+
+        dataset_id, version = self._new_version(dataset_id)
+        folder = self.path(dataset_id, version, "parts")
+        os.makedirs(folder)
+
+        dtypes = csv_dtypes(file, chunksize)
+        if hasattr(file, "seek"):
+            file.seek(0)
+
+        booleans = [column for column, dtype in dtypes.items() if dtype is object]
+        dtypes = {column: dtype for column, dtype in dtypes.items() if dtype is not object}
+
+        summary = StreamProfile()
+        for n, chunk in enumerate(pd.read_csv(file, chunksize=chunksize, dtype=dtypes)):
+            for column in booleans:
+                chunk[column] = chunk[column].astype(object)
+            summary.update(chunk)
+            self._write(chunk, os.path.join(folder, "part-" + str(n).zfill(6)))
+
+        self._join(folder, self.path(dataset_id, version, None))
+        return dataset_id, version, summary
+
+    def _join(self, folder, path):
+        '''
+        Joins the partitions written by put_csv in folder into one file (path.arrow, see _write) and removes the
+        folder. The columns are joined one at a time, so the dataset is never in memory at once, and the file has a
+        single record batch, so it is read memory-mapped without copying (joining the partitions when the dataset
+        is read would copy them in every process).
+        '''
+
+        names = sorted(os.listdir(folder))
+        if len(names) == 0 or not all(name.endswith(".arrow") for name in names):
+            # partitions that couldn't be converted to Arrow
+            parts = [self._read(os.path.join(folder, name)) for name in names]
+            self._write(pd.concat(parts, ignore_index=True) if len(parts) > 0 else pd.DataFrame(), path)
+        else:
+            parts = [feather.read_table(os.path.join(folder, name), memory_map=True) for name in names]
+            columns = []
+            for i, name in enumerate(parts[0].column_names):
+                # a partition with only missing values in the column has the null type
+                chunks = [part.column(i) for part in parts]
+                column_type = next((chunk.type for chunk in chunks if chunk.type != pa.null()), pa.null())
+                column = pa.chunked_array([array for chunk in chunks for array in chunk.cast(column_type).chunks],
+                                          column_type).combine_chunks()
+
+                # written to its own file and read back memory-mapped, so only one column is in memory
+                column_path = os.path.join(folder, "column-" + str(i).zfill(6) + ".arrow")
+                feather.write_feather(pa.table([column], names=[name]), column_path, compression="uncompressed",
+                                      chunksize=max(1, len(column)))
+                columns.append(feather.read_table(column_path, memory_map=True).column(0))
+
+            table = pa.Table.from_arrays(columns, names=parts[0].column_names, metadata=parts[0].schema.metadata)
+            feather.write_feather(table, path + ".arrow", compression="uncompressed",
+                                  chunksize=max(1, table.num_rows))
+
+        shutil.rmtree(folder)
+
+    def get(self, dataset_id, version):
+        '''
+        Returns the dataframe of a version of a dataset.
+        '''
+
+        key = (dataset_id, int(version))
+        if key in self._frames:
+            self._frames.move_to_end(key)
+            return self._frames[key]
+
+        if os.path.exists(self.path(dataset_id, version)):
+            dataframe = self._read(self.path(dataset_id, version))
+        else:
+            dataframe = self._read(self.path(dataset_id, version, "pkl"))
+
+        # versions never change, so the profile of the dataframe can be found by its id and version
+        delta = self.delta(dataset_id, version)
+        if delta is None:
+            register_key(dataframe, dataset_id + "/" + str(int(version)))
+        else:
+            register_key(dataframe, dataset_id + "/" + str(int(version)), dataset_id + "/" + str(delta["parent"]),
+                         delta["columns"])
+
+        self._frames[key] = dataframe
+        while len(self._frames) > self.cache_size:
+            self._frames.popitem(last=False)
+        return dataframe
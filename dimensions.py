@@ -1,6 +1,12 @@
-from itertools import combinations
+from itertools import combinations, groupby
+from functools import lru_cache
+import hashlib
+import heapq
+from operator import attrgetter
 import pandas as pd
 import numpy as np
+from scipy import sparse
+from profiling import get_profile
 # from app import colored
 
 
@@ -23,76 +29,438 @@ def check_perc(p, min_perc, max_perc):
     return False
 
 
-def integrity(dataframe, min_perc, max_perc):
+def report(progress, done, total):
+    '''
+    Reports the progress of a dimension (done of total pairs of columns) if a progress function was given.
+    The progress function may raise an exception to stop the dimension (for example, when a job is cancelled).
+    '''
+
+    if progress is not None:
+        progress(done, total)
+
+
+def part_slice(n, part):
+    '''
+    Returns the slice of the n units of work (pairs of columns) of a part of a dimension. part is (index, count)
+    and the work is divided in count contiguous parts, so the results of the parts can be concatenated in order
+    (see merge_parts). If part is None, all the work is done.
+    '''
+
+    if part is None:
+        return slice(0, n)
+    index, count = part
+    return slice(n * index // count, n * (index + 1) // count)
+
+
+def first_part(part):
+    '''
+    Checks whether part is the first part of a dimension (or the whole dimension), the one that generates the rules
+    that are not about pairs of columns.
+    '''
+
+    return part is None or part[0] == 0
+
+
+def merge_parts(results):
+    '''
+    Joins the results of the parts of a dimension, in the order of the parts.
+    '''
+
+    if isinstance(results[0], tuple):
+        return tuple([rule for part in results for rule in part[i]] for i in range(len(results[0])))
+    return [rule for part in results for rule in part]
+
+
+# dimensions whose rules only depend on the columns they are about, so when some columns of a dataset change only
+# the rules about them are generated again (argument only, see merge_changed). The rules are generated from all the
+# rows: a version costs the pairs of its changed columns with every column, not the number of changed rows
+INCREMENTAL = ("integrity", "completeness", "consistency", "uniqueness")
+
+
+def touches(columns, only):
+    '''
+    Checks whether a rule about the columns is generated when only the rules about the columns of only are wanted
+    (all the rules if only is None).
+    '''
+
+    return only is None or any(column in only for column in columns)
+
+
+def merge_changed(results, changed_results, columns, changed):
+    '''
+    Replaces the rules about the changed columns in the results of a dimension by changed_results, the results of
+    the same dimension with only=changed for the new version of the dataset (columns are its columns). The rules
+    are kept in the order the dimension generates them: by the positions of their columns, and for the same pair
+    of columns, (a, b) before (b, a).
+    Only the rules are merged, not the counts they were made from (those aren't kept), so changed_results are
+    computed with all the rows of the changed columns and of the columns they are compared with.
+    '''
+
+    position = {column: i for i, column in enumerate(columns)}
+
+    def order(run):
+        indexes = [position[column] for column in run[0]]
+        return sorted(indexes), indexes != sorted(indexes)
+
+    def merge(rules, changed_rules):
+        # the rules of the same columns are generated together and all come from one of the two lists, so the
+        # runs of rules are sorted instead of every rule, and the sort is stable
+        runs = [(rule_columns, list(run)) for rule_columns, run in groupby(rules, key=attrgetter("columns"))
+                if not touches(rule_columns, changed)]
+        runs += [(rule_columns, list(run)) for rule_columns, run in groupby(changed_rules, key=attrgetter("columns"))]
+        runs.sort(key=order)
+        return [rule for rule_columns, run in runs for rule in run]
+
+    if isinstance(results, tuple):
+        return tuple(merge(rules, changed_rules) for rules, changed_rules in zip(results, changed_results))
+    return merge(results, changed_results)
+
+
+def top_rules(rules, n, largest=True):
+    '''
+    Returns the n rules with the largest (or smallest) percentage of an iterable of rules, sorted by percentage
+    (rules with the same percentage keep their order). Only n rules are kept in memory while reading the rules.
+    Rules without a percentage come last.
+    '''
+
+    if largest:
+        return heapq.nlargest(n, rules, key=lambda rule: -1 if rule.score is None else rule.score)
+    return heapq.nsmallest(n, rules, key=lambda rule: 101 if rule.score is None else rule.score)
+
+
+def rule_id(rule_type, columns, values):
+    '''
+    Returns the id of a rule: a hash of its type, columns and values (not of its percentage), so the same rule has
+    the same id every time it's generated, in any process. The values of INTE1 and the values after the first one
+    of CONS1 are a set, in the order they appear in the rows, so they are sorted (a sample has them in another
+    order).
+    '''
+
+    values = [str(value) for value in values]
+    if rule_type == "INTE1":
+        values = sorted(values)
+    elif rule_type == "CONS1":
+        values = values[:1] + sorted(values[1:])
+
+    key = repr((rule_type, [str(column) for column in columns], values))
+    return hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+
+
+def join_values(values):
+    '''
+    Joins values as text: "a", "a or b", "a, b or c".
+    '''
+
+    values = [str(value) for value in values]
+    if len(values) > 1:
+        return ', '.join(values[:-1]) + " or " + values[-1]
+    return ''.join(values)
+
+
+class Rule:
+    '''
+    A generated rule: its type (INTE1, COMP2, ..., or MESSAGE for a note without a percentage), the columns it is
+    about, the values that complete it (see describe) and its percentage (score). The text of the rule is only made
+    when it is shown (str), and the id is the same every time the same rule is generated, so a rule can be found
+    again without computing the dimension (see ResultCache.rule).
+    depends is another rule that must also be kept (CONF2 rules are only generated for the CONF1 rules kept).
+    support is the number of rows the percentage was computed with (None if the score isn't a percentage of rows)
+    and given is the column whose value is the condition of the rule ("When given is ..."), if any. interval is the
+    confidence interval of the score, for rules found in a sample of the rows (see sampling.py).
+    '''
+
+    __slots__ = ("rule_type", "columns", "values", "score", "depends", "support", "given", "interval", "_id",
+                 "__weakref__")
+
+    def __init__(self, rule_type, columns=(), values=(), score=None, depends=None, support=None, given=None,
+                 interval=None):
+        self.rule_type = rule_type
+        self.columns = tuple(columns)
+        self.values = tuple(values)
+        self.score = score
+        self.depends = depends
+        self.support = support
+        self.given = given
+        self.interval = interval
+        self._id = None
+
+    @property
+    def id(self):
+        if self._id is None:
+            self._id = rule_id(self.rule_type, self.columns, self.values)
+        return self._id
+
+    def describe(self):
+        '''
+        Returns the text of the rule without its percentage.
+        '''
+
+        rule_type, values = self.rule_type, self.values
+        columns = [str(column) for column in self.columns]
+
+        if rule_type == "INTE1":
+            return columns[0] + " is equal to " + join_values(values)
+        if rule_type == "INTE2":
+            return columns[0] + " is equal to " + columns[1]
+        if rule_type == "COMP1":
+            return columns[0] + " is populated"
+        if rule_type == "COMP2":
+            return "When " + columns[0] + " is " + str(values[0]) + " then " + columns[1] + " is populated"
+        if rule_type == "COMP3":
+            return "When " + columns[0] + " is populated then " + columns[1] + " is populated"
+        if rule_type == "CONS1":
+            return "When " + columns[0] + " is " + str(values[0]) + " then " + columns[1] + " is " \
+                   + join_values(values[1:])
+        if rule_type == "UNIQ1":
+            return columns[0] + " is unique"
+        if rule_type == "UNIQ2":
+            if self.score == 100:
+                return "Unique combination:" + str(columns)
+            return "Combination of " + ', '.join(columns[:-1]) + " and " + columns[-1] + " is unique"
+        if rule_type == "REL1":
+            return "All records in one table exists in the other"
+        if rule_type == "REL2":
+            return "When " + columns[1] + " is " + str(values[0]) + " then all records in " + str(values[1]) \
+                   + " also exist in " + str(values[2])
+        if rule_type == "CONF1":
+            return columns[0] + " has pattern " + str(values[0])
+        if rule_type == "CONF2":
+            return "When " + columns[0] + " equal to " + str(values[0]) + " then " + columns[1] + " has pattern " \
+                   + str(values[1])
+        if rule_type == "CONF3":
+            return columns[0] + " length ranges between " + str(values[0]) + " & " + str(values[1])
+        if rule_type == "CONF4":
+            return columns[0] + " value ranges between " + str(values[0]) + " & " + str(values[1])
+        if rule_type == "CONF5":
+            return columns[0] + " contains " + str(values[0]) + " values"
+        return ' '.join(str(value) for value in values)  # MESSAGE
+
+    def __str__(self):
+        text = self.describe()
+
+        if self.rule_type in ("CONF3", "CONF4"):
+            text += ": 100 %"
+        elif self.score is not None and not (self.rule_type == "UNIQ2" and self.score == 100):
+            text += ": " + str(self.score) + "%"
+
+        if self.interval is not None:
+            low, high = self.interval
+            text += " ± " + str(round(max(self.score - low, high - self.score), 2)) + "%"
+        return text
+
+    def __repr__(self):
+        return "Rule(" + self.id + ", " + repr(str(self)) + ")"
+
+    def passes(self, min_perc, max_perc):
+        '''
+        Checks whether the rule would be kept with the minimum and maximum. A rule with a confidence interval is
+        kept if the interval and the range of the minimum and maximum overlap.
+        '''
+
+        if self.depends is not None and not self.depends.passes(min_perc, max_perc):
+            return False
+        if self.interval is not None:
+            return self.interval[1] >= min_perc and self.interval[0] <= max_perc
+        return self.score is None or check_perc(self.score, min_perc, max_perc)
+
+
+# auxiliary functions for integrity
+def dtype_family(dtype):
+    '''
+    Returns the family of values of a dtype: "number", "datetime", "timedelta" or None for object columns
+    (that can hold values of any family).
+    '''
+
+    if dtype.kind in "biufc":
+        return "number"
+    if dtype.kind == "M":
+        return "datetime"
+    if dtype.kind == "m":
+        return "timedelta"
+    return None
+
+
+def equality_counts(profile, columns, tile=32, chunk=8192, progress=None, wanted=None, min_perc=0):
+    '''
+    Returns a matrix with the number of rows in which each pair of columns has the same value (NaN is never equal).
+    Only the upper triangle (i < j) is filled.
+
+    The distinct values of all columns are factorized together, so equal values have the same code in every
+    column, and the codes are compared in tiles of columns and chunks of rows. Pairs of columns that can't
+    have equal values (incompatible dtypes or no distinct value in common) are skipped.
+    If wanted is given (a boolean matrix), only those pairs are counted.
+    Pairs that can't be equal in min_perc % of the rows are skipped too (left with 0): two columns are equal at
+    most in the rows of each column whose value is also a value of the other column.
+    progress is called with the number of pairs of columns done after each tile.
+    '''
+
+    n = len(columns)
+    counts = np.zeros((n, n), dtype=np.int64)
+    if n < 2 or profile.n_rows == 0:
+        return counts
+
+    # common factorization of the distinct values of all columns
+    uniques = [profile[column].uniques for column in columns]
+    offsets = np.cumsum([0] + [len(u) for u in uniques])
+    global_codes, all_uniques = pd.factorize(np.concatenate(uniques))
+    global_codes = global_codes.astype(np.int32)
+
+    # pairs of columns with at least one distinct value in common
+    positions = (np.repeat(np.arange(n), np.diff(offsets)), global_codes)
+    membership = sparse.csr_matrix((np.ones(len(global_codes), dtype=np.int32), positions),
+                                   shape=(n, len(all_uniques)))
+    shared = (membership @ membership.T).toarray() > 0
+
+    if min_perc > 0:
+        # rows of each column whose value is a value of the other column, an upper bound of the equal rows
+        value_counts = sparse.csr_matrix((np.concatenate([profile[column].counts for column in columns]), positions),
+                                         shape=membership.shape)
+        in_other = (value_counts @ membership.T).toarray()
+        shared &= np.minimum(in_other, in_other.T) / profile.n_rows * 100 >= min_perc
+
+    families = [dtype_family(profile[column].series.dtype) for column in columns]
+    compatible = np.array([[f1 is None or f2 is None or f1 == f2 for f2 in families] for f1 in families])
+
+    wanted = np.triu(np.ones((n, n), dtype=bool), k=1) if wanted is None else np.triu(wanted, k=1)
+    needed = shared & compatible & wanted
+    total, done = wanted.sum(), 0
+
+    # the last position is used by the missing values (code -1); they get different codes in the two sides
+    # of the comparison so that they never match
+    left = [np.append(global_codes[offsets[i]:offsets[i + 1]], np.int32(-1)) for i in range(n)]
+    right = [np.append(global_codes[offsets[i]:offsets[i + 1]], np.int32(-2)) for i in range(n)]
+
+    for a in range(0, n, tile):
+        for b in range(a, n, tile):
+            block_needed = needed[a:a + tile, b:b + tile]
+            done += wanted[a:a + tile, b:b + tile].sum()
+            if not block_needed.any():
+                report(progress, done, total)
+                continue
+
+            block = np.zeros(block_needed.shape, dtype=np.int64)
+            for start in range(0, profile.n_rows, chunk):
+                A = np.column_stack([left[i][profile[columns[i]].codes[start:start + chunk]]
+                                     for i in range(a, min(a + tile, n))])
+                B = np.column_stack([right[j][profile[columns[j]].codes[start:start + chunk]]
+                                     for j in range(b, min(b + tile, n))])
+                block += (A[:, :, None] == B[:, None, :]).sum(axis=0)
+
+            counts[a:a + tile, b:b + tile] = np.where(block_needed, block, 0)
+            report(progress, done, total)
+
+    return counts
+
+
+def integrity(dataframe, min_perc, max_perc, progress=None, part=None, only=None):
     '''
     Output: res1,res2
+    progress is called with the number of pairs of columns done and the total.
+    part is (index, count) to generate only a part of the rules (see part_slice).
+    only is a set of columns, to generate only the rules about them (see merge_changed).
     '''
 
-    dataframe = dataframe.replace(r'^\s*$', np.NaN, regex=True)  # replace " " with NaN
+    profile = get_profile(dataframe)  # blank values are treated as NaN
 
     # INTE1:
     res1 = []
 
-    for column in dataframe.columns:
+    for column in (dataframe.columns if first_part(part) else []):
+        if not touches([column], only):
+            continue
 
-        valores = dataframe[column].dropna().drop_duplicates().tolist()  # remove repeated, move to list
+        valores = profile[column].uniques.tolist()  # remove repeated, move to list
 
         if len(valores) > 1:
-            valores2 = valores[0:len(valores) - 1]  # the last value, it's just to print
-
-            not_null = len(dataframe[column].dropna())
-            total = len(dataframe[column])
+            not_null = profile.n_rows - profile[column].null_count
+            total = profile.n_rows
 
             percentagem = not_null / total * 100
-            res = "" + column + " is equal to " + ', '.join(str(v) for v in valores2) + " or " \
-                  + str(valores[-1]) + ": " + str(percentagem) + "%"
 
         else:
-            res = "" + column + " is equal to " + str(valores[0]) + ": 100%"
             percentagem = 100
 
         if check_perc(percentagem, min_perc, max_perc):
-            res1.append(res)
+            res1.append(Rule("INTE1", [column], valores, percentagem, support=profile.n_rows))
 
     # INTE2:
     res2 = []
 
-    column_combinations = list(combinations(dataframe, 2))  # all 2-column combinations
+    columns = list(dataframe.columns)
+    pairs = list(combinations(range(len(columns)), 2))  # all 2-column combinations
+    pairs = [(i, j) for i, j in pairs if touches([columns[i], columns[j]], only)]
+    pairs = pairs[part_slice(len(pairs), part)]
 
-    for combination in column_combinations:
-        column1, column2 = combination
-        df = dataframe[[column1, column2]]
+    wanted = np.zeros((len(columns), len(columns)), dtype=bool)
+    wanted[tuple(np.array(pairs, dtype=int).reshape(-1, 2).T)] = True
+
+    # number of equal values of every pair of columns, the pairs that can't reach min_perc aren't counted
+    counts = equality_counts(profile, columns, progress=progress, wanted=wanted, min_perc=min_perc)
 
-        count = (dataframe[column1] == dataframe[column2]).sum()
+    for i, j in pairs:
+        column1, column2 = columns[i], columns[j]
 
-        p = count / len(df) * 100
-        res = "" + column1 + " is equal to " + column2 + ": " + str(p) + "%"
+        count = counts[i, j]
+
+        p = count / profile.n_rows * 100
 
         if check_perc(p, min_perc, max_perc):
-            res2.append(res)
+            res2.append(Rule("INTE2", [column1, column2], score=p, support=profile.n_rows))
 
     return res1, res2
 
 
-def completeness(dataframe, min_perc, max_perc):  #
+# auxiliary functions for completeness
+def populated_rules(columns, n_rows, null_counts, min_perc, max_perc):
     '''
-    Output: res1,res2,res3
+    COMP1 rules of the columns, from the number of missing values of each column (null_counts[i] for columns[i]).
     '''
 
-    dataframe = dataframe.replace(r'^\s*$', np.NaN, regex=True)
-
     res1 = []
 
-    total_rows = len(dataframe)
-
-    for column in dataframe.columns:
+    for column, null_count in zip(columns, null_counts):
 
-        notna = dataframe[column].notna().sum()
+        notna = n_rows - null_count
 
-        p = notna / total_rows * 100
-        res = "" + column + " is populated: " + str(p) + "%"
+        p = notna / n_rows * 100
         if check_perc(p, min_perc, max_perc):
-            res1.append(res)
+            res1.append(Rule("COMP1", [column], score=p, support=n_rows))
+
+    return res1
+
+
+def populated_counts(profile, column, columns, block=64):
+    '''
+    Returns a matrix with the number of rows in which each column of columns is populated, for each distinct value
+    of column (one line per value, in the same order as profile[column].uniques).
+    Uses a single groupby for each block of columns.
+    '''
+
+    rows = ~profile[column].null_mask
+    codes = profile[column].codes[rows]
+    counts = np.zeros((len(profile[column].uniques), len(columns)), dtype=np.int64)
+
+    for start in range(0, len(columns), block):
+        populated = pd.DataFrame({i: ~profile[c].null_mask[rows] for i, c in enumerate(columns[start:start + block])})
+        counts[:, start:start + block] = populated.groupby(codes).sum().to_numpy()
+
+    return counts
+
+
+def completeness(dataframe, min_perc, max_perc, progress=None, part=None, only=None):  #
+    '''
+    Output: res1,res2,res3
+    progress is called with the number of pairs of columns done and the total.
+    part is (index, count) to generate only a part of the rules (see part_slice).
+    only is a set of columns, to generate only the rules about them (see merge_changed).
+    '''
+
+    profile = get_profile(dataframe)  # blank values are treated as NaN
+
+    total_rows = len(dataframe)
+
+    columns = [column for column in dataframe.columns if touches([column], only)] if first_part(part) else []
+    res1 = populated_rules(columns, total_rows, [profile[column].null_count for column in columns], min_perc, max_perc)
 
     res2 = []
     res3 = []
@@ -102,38 +470,72 @@ def completeness(dataframe, min_perc, max_perc):  #
 
     for combination in column_combinations:
         column1, column2 = combination
-        cc.append((column1, column2))
-        cc.append((column2, column1))
-
-    for column1, column2 in cc:  # COMP2:
-
-        # COMP2:
-        df1 = dataframe[[column1, column2]]
-        values = df1[column1].drop_duplicates().dropna().tolist()
+        if touches(combination, only):
+            cc.append((column1, column2))
+            cc.append((column2, column1))
+
+    cc = cc[part_slice(len(cc), part)]
+    pairs = set(cc)
+
+    # COMP2: one pass for each column, that gives the populated rates of all the other columns
+    rules = {}
+    done = 0
+
+    for column1 in dataframe.columns:
+        columns = [column for column in dataframe.columns if column != column1 and (column1, column) in pairs]
+        if len(columns) == 0:
+            continue
+        report(progress, done, len(cc))
+        done += len(columns)
+
+        values = profile[column1].uniques.tolist()
+        n_values = profile[column1].counts  # number of rows of each value of column1
+
+        # the rows of a value in which column2 is populated are at least all the rows but the missing values of
+        # column2, and at most all the rows or the populated values of column2: only the columns with missing values
+        # and whose bounds reach the minimum and maximum are counted
+        counted = []
+        for column2 in columns:
+            null_count = profile[column2].null_count
+            lowest = np.maximum(n_values - null_count, 0) / n_values * 100
+            highest = np.minimum(n_values, profile.n_rows - null_count) / n_values * 100
+            if null_count > 0 and ((highest >= min_perc) & (lowest <= max_perc)).any():
+                counted.append(column2)
+
+        counts = populated_counts(profile, column1, counted)
+        counted = {column2: k for k, column2 in enumerate(counted)}
+
+        for column2 in columns:
+            rules[column1, column2] = []
+
+            if column2 in counted:
+                notna = counts[:, counted[column2]]
+            elif profile[column2].null_count == 0:
+                notna = n_values  # always populated
+            else:
+                continue
 
-        for value in values:
+            p = notna / n_values * 100
+            for code in np.flatnonzero((p >= min_perc) & (p <= max_perc)):
+                rules[column1, column2].append(Rule("COMP2", [column1, column2], [values[code]], p[code],
+                                                    support=n_values[code], given=column1))
 
-            df = df1[df1[column1] == value]
-            n_values = len(df)
+    report(progress, len(cc), len(cc))
 
-            notna = df[column2].notna().sum()
+    for column1, column2 in cc:
 
-            p = notna / n_values * 100
-            res = "" + "When " + column1 + " is " + str(value) + " then " + column2 + \
-                  " is populated: " + str(p) + "%"
-            if check_perc(p, min_perc, max_perc):
-                res2.append(res)
+        # COMP2:
+        res2 += rules[column1, column2]
 
         # COMP3:
-        missing_values_c1 = dataframe[column1].isnull().sum()
+        missing_values_c1 = profile[column1].null_count
 
         if missing_values_c1 == 0:
-            number_values_c2 = dataframe[column2].count()
+            number_values_c2 = total_rows - profile[column2].null_count
 
             p = number_values_c2 / total_rows * 100
-            res = "When " + column1 + " is populated then " + column2 + " is populated: " + str(p) + "%"
             if check_perc(p, min_perc, max_perc):
-                res3.append(res)
+                res3.append(Rule("COMP3", [column1, column2], score=p, support=total_rows))
 
     return res1, res2, res3
 
@@ -144,201 +546,403 @@ def getUniqueColumns(dataframe):
     Returns columns that only have single values.
     '''
 
-    uniques = []
-    for column in dataframe.columns:
-        if dataframe[column].is_unique:
-            uniques.append(column)
-    return uniques
+    return get_profile(dataframe).unique_columns(raw=True)
+
+
+# auxiliary function for consistency
+def value_crosstab(profile, column1, column2, max_values=None):
+    '''
+    Returns the contingency table of two columns as three arrays (code of column1, code of column2, count),
+    with only the pairs of values that occur. The table is sorted by code of column1 and then by count, from
+    the most to the least frequent value of column2 (ties keep the order of the values in the column).
+    If max_values is given, only the max_values most frequent values of column2 are kept for each value of column1.
+    '''
+
+    codes1 = profile[column1].codes
+    codes2 = profile[column2].codes
+    rows = (codes1 != -1) & (codes2 != -1)
+
+    n2 = np.int64(len(profile[column2].uniques))
+    cells, counts = np.unique(codes1[rows].astype(np.int64) * n2 + codes2[rows], return_counts=True)
+    codes1, codes2 = cells // n2, cells % n2
 
+    order = np.lexsort((codes2, -counts, codes1))
+    codes1, codes2, counts = codes1[order], codes2[order], counts[order]
 
-def consistency(dataframe, min_perc, max_perc):
+    if max_values is not None and len(codes1) > 0:
+        starts = np.flatnonzero(np.r_[True, codes1[1:] != codes1[:-1]])  # first line of each value of column1
+        rank = np.arange(len(codes1)) - np.repeat(starts, np.diff(np.r_[starts, len(codes1)]))
+        keep = rank < max_values
+        codes1, codes2, counts = codes1[keep], codes2[keep], counts[keep]
+
+    return codes1, codes2, counts
+
+
+def consistency(dataframe, min_perc, max_perc, max_values=3, progress=None, part=None, only=None):
     '''
     Output: res1
+    For each value of a column, the values of the other column are added from the most to the least frequent,
+    up to max_values values ("When X is a then Y is b1, b2 or b3").
+    progress is called with the number of pairs of columns done and the total.
+    part is (index, count) to generate only a part of the rules (see part_slice).
+    only is a set of columns, to generate only the rules about them (see merge_changed).
     '''
 
     # CONS1:
-    res1 = []
+    return list(iter_consistency(dataframe, min_perc, max_perc, max_values, progress, part, only))
 
-    dataframe = dataframe.replace(r'^\s*$', np.NaN, regex=True)  # replace " " with NaN
+
+def iter_consistency(dataframe, min_perc, max_perc, max_values=3, progress=None, part=None, only=None):
+    '''
+    Yields the CONS1 rules of consistency one at a time, so they can be read (for example, only the first ones or
+    the best ones, see top_rules) without keeping all of them in memory.
+    '''
+
+    profile = get_profile(dataframe)  # blank values are treated as NaN
 
     # remove columns that only have single values
-    uniques = getUniqueColumns(dataframe)
+    uniques = profile.unique_columns()
     dfWithoutUniques = dataframe.drop(columns=uniques)
     column_combinations = list(combinations(dfWithoutUniques, 2))  # all 2-column combinations
     cc = []
 
     for column1, column2 in column_combinations:
-        cc.append((column1, column2))
-        cc.append((column2, column1))
+        if touches((column1, column2), only):
+            cc.append((column1, column2))
+            cc.append((column2, column1))
 
-    for column1, column2 in cc:
-        df1 = dataframe[[column1, column2]]
+    cc = cc[part_slice(len(cc), part)]
 
-        values_c1 = (dataframe[column1].drop_duplicates().dropna().tolist())
-        values_c2 = (dataframe[column2].drop_duplicates().dropna().tolist())
+    for n, (column1, column2) in enumerate(cc):
+        report(progress, n, len(cc))
+        values_c1 = profile[column1].uniques.tolist()
+        values_c2 = profile[column2].uniques.tolist()
+        totals = profile[column1].counts  # number of lines of each value of column1
 
-        values_c2 = list(combinations(values_c2, int(np.ceil(0.50 * len(values_c2)))))
+        codes_c1, codes_c2, counts = value_crosstab(profile, column1, column2, max_values)
+        if len(codes_c1) == 0:
+            continue
 
-        for value_c1 in values_c1:
+        # % of the rows of each value of column1 with its most frequent value of column2, its two most frequent
+        # values, ..., computed for all the lines of the table at once
+        starts = np.flatnonzero(np.r_[True, codes_c1[1:] != codes_c1[:-1]])  # first line of each value of column1
+        first = np.repeat(starts, np.diff(np.r_[starts, len(codes_c1)]))
+        cumulative = np.cumsum(counts)
+        total_counts = cumulative - cumulative[first] + counts[first]
+        p = total_counts / totals[codes_c1] * 100
 
-            df = df1[df1[column1] == value_c1]
-            total = len(df)
+        # the rules are only made for the lines kept
+        for i in np.flatnonzero((p >= min_perc) & (p <= max_perc)):
+            code_c1 = codes_c1[i]
+            value_c2 = [values_c2[code_c2] for code_c2 in codes_c2[first[i]:i + 1]]
 
-            for value_c2 in values_c2:
+            # values: the value of column1 and then the values of column2
+            yield Rule("CONS1", [column1, column2], [values_c1[code_c1]] + value_c2, p[i], support=totals[code_c1],
+                       given=column1)
 
-                count = 0
-                for i in value_c2:
-                    count += (df[column2].values == i).sum()
+    report(progress, len(cc), len(cc))
 
-                if count == 0:
-                    p = 0
-                else:
-                    p = count / total * 100
 
-                res = "" + "When " + column1 + " is " + str(value_c1) + " then " + column2 + " is "
+# auxiliary functions for uniqueness
+def refine_partition(profile, codes, column):
+    '''
+    Refines a partition of the rows (rows with the same values in a combination of columns have the same code)
+    with one more column. Returns the codes of the new partition, from 0 to the number of groups - 1.
+    '''
 
-                end = len(value_c2)
-                for i, v in enumerate(value_c2):
-                    if i == end - 1:
-                        res += str(v)
-                    elif i == end - 1 - 1:
-                        res += str(v) + " or "
-                    else:
-                        res += str(v) + ", "
+    # both codes are smaller than the number of rows, so the combined code fits in 64 bits without collisions
+    combined = codes.astype(np.int64) * len(profile[column].raw_uniques) + profile[column].raw_codes
+    return pd.factorize(combined)[0]
 
-                res += ": " + str(p) + "%"
 
-                if check_perc(p, min_perc, max_perc):
-                    res1.append(res)
+def combination_partition(profile, combination):
+    '''
+    Returns the partition of the rows for a combination of columns (see refine_partition). NaN is a value.
+    '''
 
-    return res1
+    codes = profile[combination[0]].raw_codes
+    for column in combination[1:]:
+        codes = refine_partition(profile, codes, column)
+    return codes
 
 
-def uniqueness(dataframe, min_perc, max_perc):
+def uniqueness(dataframe, min_perc, max_perc, max_columns=2, progress=None, part=None, only=None):
     '''
     Output: res1,res2
+    UNIQ2 tests combinations of up to max_columns columns. Combinations that contain a smaller unique
+    combination (a key) are skipped.
+    progress is called with the number of combinations of columns done and the total.
+    part is (index, count) to generate only a part of the rules (see part_slice). The combinations of more than
+    two columns depend on the keys found with less columns, so they are only divided if max_columns is 2.
+    only is a set of columns, to generate only the rules about them (see merge_changed), also only if max_columns
+    is 2.
     '''
 
+    if only is not None and max_columns != 2:
+        raise ValueError("only the rules of combinations of 2 columns can be generated for some columns")
+
+    profile = get_profile(dataframe)
+
     # UNIQ1:
     res1 = []
 
-    for column in dataframe.columns:
+    for column in (dataframe.columns if first_part(part) else []):
+        if not touches([column], only):
+            continue
 
-        if dataframe[column].is_unique:
+        if profile[column].raw_is_unique:
             p = 100
-            res = "" + column + " is unique: 100%"
             if check_perc(p, min_perc, max_perc):
-                res1.append(res)
+                res1.append(Rule("UNIQ1", [column], score=p))
         else:
-            comp1 = len(dataframe[column])  # number of lines
-            comp2 = len(dataframe[column].drop_duplicates(keep=False))
+            comp1 = profile.n_rows  # number of lines
+            comp2 = (profile[column].raw_counts == 1).sum()  # number of values that are not repeated
 
             p = comp2 / comp1 * 100
-            res = "" + column + " is unique: " + str(p) + "%"
             if check_perc(p, min_perc, max_perc):
-                res1.append(res)
+                res1.append(Rule("UNIQ1", [column], score=p))
 
     # UNIQ2:
     res2 = []
 
     # remove columns that only have single values
-    uniques = getUniqueColumns(dataframe)
+    uniques = profile.unique_columns(raw=True)
 
-    dfWithoutUniques = dataframe.drop(columns=uniques)
+    columns = [column for column in dataframe.columns if column not in uniques]
 
-    # nr_columns = len(dfWithoutUniques.columns)
+    keys = set()  # combinations that are unique (keys) and combinations that contain a key
 
-    column_combinations = list(combinations(dfWithoutUniques.columns, 2))
+    levels = [[c for c in combinations(columns, size) if touches(c, only)] for size in range(2, max_columns + 1)]
+    if max_columns == 2:
+        levels = [levels[0][part_slice(len(levels[0]), part)]]
+    elif not first_part(part):
+        levels = []
 
-    for i in range(len(column_combinations)):
-        combination = list(column_combinations[i])  # it must go to the list because column_combinations[i] is
-        # a tuple
+    total = sum(len(level) for level in levels)
+    done = 0
 
-        comp1 = len(dfWithoutUniques[combination])  # number of lines
-        comp2 = len(dfWithoutUniques[combination].drop_duplicates(keep=False))  # number of unrepeated lines
-        # keep=False to keep one of the repeated
+    for level in levels:
 
-        if comp1 == comp2:
+        prefix = None  # combinations are generated in order, so the partition of the prefix is reused
 
-            p = 100
-            res = "" + "Unique combination:" + str(combination)
-            if check_perc(p, min_perc, max_perc):
-                res2.append(res)
+        for combination in level:
+            report(progress, done, total)
+            done += 1
 
-        else:
-            comb = combination[0:len(combination) - 1]
+            # a combination that contains a key isn't a new key
+            if len(combination) > 2 and any(c in keys for c in combinations(combination, len(combination) - 1)):
+                keys.add(combination)
+                continue
 
-            p = comp2 / comp1 * 100
-            res = "" + "Combination of " + (', '.join(str(c) for c in comb)) + " and " \
-                  + str(combination[-1]) + " is unique: " + str(p) + "%"
-            if check_perc(p, min_perc, max_perc):
-                res2.append(res)
+            if combination[:-1] != prefix:
+                prefix = combination[:-1]
+                prefix_codes = combination_partition(profile, prefix)
+
+            codes = refine_partition(profile, prefix_codes, combination[-1])
+
+            comp1 = profile.n_rows  # number of lines
+            comp2 = (np.bincount(codes) == 1).sum()  # number of unrepeated lines
+
+            if comp1 == comp2:
+                keys.add(combination)
+
+                p = 100
+                if check_perc(p, min_perc, max_perc):
+                    res2.append(Rule("UNIQ2", combination, score=p))
+
+            else:
+                p = comp2 / comp1 * 100
+                if check_perc(p, min_perc, max_perc):
+                    res2.append(Rule("UNIQ2", combination, score=p))
+
+    report(progress, total, total)
 
     return res1, res2
 
 
-def relevancy(dataframe1, dataframe2, table_name, table_name_2, min_perc, max_perc):
+def relevancy_key(dataframe1, dataframe2):
     '''
-    Output: res1,res2
+    Returns the first column of both tables that only has single values, used by relevancy to match the records.
     '''
 
     columns_intersection = (dataframe1.columns).intersection(dataframe2.columns)
-    columnUNIQUE = getUniqueColumns(dataframe1[columns_intersection])[0]
+    return get_profile(dataframe1).unique_columns(columns_intersection, raw=True)[0]
+
+
+def relevancy(dataframe1, dataframe2, table_name, table_name_2, min_perc, max_perc, key=None, progress=None,
+              part=None):
+    '''
+    Output: res1,res2
+    key is the column used to match the records of the two tables. If it's None, the first column of both
+    tables that only has single values is used.
+    progress is called with the number of columns done and the total.
+    part is (index, count) to generate only a part of the rules (see part_slice).
+    '''
+
+    profile = get_profile(dataframe1)
+    profile2 = get_profile(dataframe2)
+
+    if key is None:
+        key = relevancy_key(dataframe1, dataframe2)
 
     # REL1:
     res1 = []
 
     n_rows = len(dataframe1)  # número de linhas
-    values1 = dataframe1[columnUNIQUE]
-    values2 = dataframe2[columnUNIQUE]
 
-    v1_in_v2 = values1.isin(values2).sum()  # see how many values v1 are in v2
+    # see which values of v1 are in v2, looking up each distinct value of v1 once in the index of v2
+    found = profile2[key].index.get_indexer(profile[key].raw_uniques) != -1
+    v1_in_v2 = found[profile[key].raw_codes]
 
-    p = v1_in_v2 / n_rows * 100
-    res = "" + "All records in one table exists in the other: " + str(p) + '%'
-    if check_perc(p, min_perc, max_perc):
-        res1.append(res)
+    p = v1_in_v2.sum() / n_rows * 100
+    if check_perc(p, min_perc, max_perc) and first_part(part):
+        res1.append(Rule("REL1", [key], score=p, support=n_rows))
 
     # REL2:
     res2 = []
 
-    dataframe1 = dataframe1.replace(r'^\s*$', 'blank', regex=True)
-    columns = dataframe1.columns.drop(columnUNIQUE)
+    columns = dataframe1.columns.drop(key)
+    columns = columns[part_slice(len(columns), part)]
 
-    for column in columns:
-        values = (dataframe1[column].drop_duplicates().tolist())
+    for n, column in enumerate(columns):
+        report(progress, n, len(columns))
+        codes, values = profile[column].view(blank='blank')  # replace " " with blank
+        rows = codes != -1
 
-        for value in values:
-            fvalues1 = dataframe1[(dataframe1[column] == value)][columnUNIQUE]  # dataframe that only has value
-            # value in column
-            fn_rows = len(fvalues1)  # number of lines
-            fv1_in_v2 = fvalues1.isin(values2).sum()  # see how many values of v1 are in v2
+        # percentage of the records of each value that exist in the other table
+        rates = pd.Series(v1_in_v2[rows]).groupby(codes[rows]).mean().to_numpy()
+        sizes = np.bincount(codes[rows], minlength=len(values))
 
-            if fv1_in_v2 == 0:  # gave an error in the division
-                p = 0
+        values = values.tolist()
+        kept = np.flatnonzero((rates * 100 >= min_perc) & (rates * 100 <= max_perc))
 
-            else:
-                p = fv1_in_v2 / fn_rows * 100
+        for code in kept:
+            p = rates[code] * 100
 
-            res = "" + "When " + column + " is " + str(value) + " then all records in " \
-                  + table_name + " also exist in " + table_name_2 + ": " + str(p) + "%"
-            if check_perc(p, min_perc, max_perc):
-                res2.append(res)
+            res2.append(Rule("REL2", [key, column], [values[code], table_name, table_name_2], p, support=sizes[code],
+                             given=column))
+
+    report(progress, len(columns), len(columns))
 
     return res1, res2
 
 
 # auxiliary functions for conformity
-def long_substr(data):
+def suffix_automaton(word):
+    '''
+    Builds the suffix automaton of a word. Returns, for each state, the transitions, the suffix link, the length
+    of the longest substring of the state and the index where that substring first ends in the word.
+    '''
+
+    nexts, links, lengths, ends = [{}], [-1], [0], [-1]
+    last = 0
+
+    for i, letter in enumerate(word):
+        current = len(lengths)
+        nexts.append({})
+        links.append(0)
+        lengths.append(lengths[last] + 1)
+        ends.append(i)
+
+        state = last
+        while state != -1 and letter not in nexts[state]:
+            nexts[state][letter] = current
+            state = links[state]
+
+        if state != -1:
+            following = nexts[state][letter]
+            if lengths[state] + 1 == lengths[following]:
+                links[current] = following
+            else:  # split the state
+                clone = len(lengths)
+                nexts.append(dict(nexts[following]))
+                links.append(links[following])
+                lengths.append(lengths[state] + 1)
+                ends.append(ends[following])
+                while state != -1 and nexts[state].get(letter) == following:
+                    nexts[state][letter] = clone
+                    state = links[state]
+                links[following] = clone
+                links[current] = clone
+
+        last = current
+
+    return nexts, links, lengths, ends
+
+
+def common_substr(data):
+    '''
+    Returns the longest common substring of a list of strings, with the suffix automaton of the shortest one.
+    The cost is linear in the total number of characters, and it stops as soon as nothing is common.
+    '''
+
+    data = sorted(set(data), key=len)
+    base = data[0]
+    nexts, links, lengths, ends = suffix_automaton(base)
+    order = sorted(range(len(lengths)), key=lengths.__getitem__, reverse=True)  # longest states first
+
+    best = list(lengths)  # length of the longest substring of each state that is common to all the words
+
+    for word in data[1:]:
+        matched = [0] * len(lengths)
+        state, length = 0, 0
+
+        for letter in word:
+            while state and letter not in nexts[state]:
+                state = links[state]
+                length = lengths[state]
+            if letter in nexts[state]:
+                state = nexts[state][letter]
+                length += 1
+            if length > matched[state]:
+                matched[state] = length
+
+        for state in order:  # the suffixes of a matched substring are also matched
+            link = links[state]
+            if matched[state] and link > 0:
+                matched[link] = lengths[link]
+            best[state] = min(best[state], matched[state])
+
+        if max(best) == 0:  # nothing in common, no need to read the other words
+            return ""
+
+    # longest common substring, the first one in the base word if there is a tie
+    state = min(range(len(best)), key=lambda s: (-best[s], ends[s]))
+    return base[ends[state] - best[state] + 1:ends[state] + 1]
+
+
+def long_substr(data, sample=None, seed=0):
     '''
     Returns the longest common substring in a string list.
+    With sample, the substring is searched in a random sample of sample values and only checked against the other
+    values. If it isn't common to all of them, the whole list is used.
+    '''
+
+    if len(data) == 0:
+        return ""
+
+    if sample is not None and len(data) > sample:
+        rng = np.random.default_rng(seed)
+        sampled = [data[i] for i in rng.choice(len(data), size=sample, replace=False)]
+        substring = common_substr(sampled)
+        if all(substring in value for value in data):
+            return substring
+
+    return common_substr(data)
+
+
+class ShapeTable(dict):
+    '''
+    Translation table for str.translate: numbers become N and any other character becomes C.
     '''
 
-    substrs = lambda x: {x[i:i + j] for i in range(len(x)) for j in range(len(x) - i + 1)}
-    s = substrs(data[0])
-    for val in data[1:]:
-        s.intersection_update(substrs(val))
-    return max(s, key=len)
+    def __missing__(self, key):
+        shape = ord("N") if 48 <= key <= 57 else ord("C")
+        self[key] = shape
+        return shape
+
+
+shapes = ShapeTable()
 
 
 def convert(word):
@@ -346,14 +950,7 @@ def convert(word):
     Takes a word and converts it to a string of C's and N's.
     '''
 
-    word = str(word)
-    result = list(word)
-    for i in range(len(result)):
-        if ord(result[i]) >= 48 and ord(result[i]) <= 57:
-            result[i] = "N"
-        else:
-            result[i] = "C"
-    return "".join(result)
+    return str(word).translate(shapes)
 
 
 def divideList(lst):
@@ -390,55 +987,146 @@ def list_pattern(patterns):
     return "".join(res)
 
 
-def check_pattern(column_values, miss_values, reg_exp):
+@lru_cache(maxsize=1024)
+def compile_pattern(reg_exp):
     '''
-    Returns which \% of column values that match the regular expression reg_exp.
+    Compiles a pattern (C = letter, N = number, * = letter or number, other letters and numbers are literal, {}
+    are ignored) into a table with one line per position and one column per ASCII character, that says which
+    characters match in each position. Column 128 stands for any other character and never matches, the same as
+    the comparison letter by letter.
     '''
 
     reg_exp = reg_exp.replace("{", "")
     reg_exp = reg_exp.replace("}", "")
 
-    count = 0  # number of words that match the expression in the column
-    for value in column_values:
-        check_letter = 0  # number of right letters in the word value
-        value = list(value)  # convert value into analysis into a list
-        r = list(reg_exp)  # *123C -> [*,1,2,3,C]
+    numbers = np.zeros(129, dtype=bool)
+    numbers[ord("0"):ord("9") + 1] = True
+    letters = np.zeros(129, dtype=bool)
+    letters[ord("A"):ord("Z") + 1] = True
+    letters[ord("a"):ord("z") + 1] = True
+
+    table = np.zeros((len(reg_exp), 129), dtype=bool)
+    for i, letter in enumerate(reg_exp):
+        if letter == "*":
+            table[i] = numbers | letters
+        elif letter == "N":  # a number, or the letter N
+            table[i] = numbers
+            table[i, ord("N")] = True
+        elif letter == "C":
+            table[i] = letters
+        elif ord(letter) < 128 and (numbers[ord(letter)] or letters[ord(letter)]):
+            table[i, ord(letter)] = True
+    return table
+
+
+def match_uniques(uniques, reg_exp):
+    '''
+    Returns a boolean array saying which of the (distinct) values match the regular expression reg_exp.
+    The values with the size of the pattern are put in a fixed width array of character codes and all positions
+    are checked at once with the table of compile_pattern.
+    '''
+
+    table = compile_pattern(reg_exp)
+    size = len(table)
+
+    uniques = pd.Series(uniques, dtype=object)
+    matches = np.zeros(len(uniques), dtype=bool)
+
+    same_size = (uniques.str.len() == size).to_numpy()  # values that aren't strings give NaN, so False
+    if size > 0 and same_size.any():
+        words = uniques[same_size].to_numpy(dtype="U" + str(size))
+        letters = words.view(np.uint32).reshape(len(words), size)
+        letters = np.minimum(letters, 128)
+        matches[same_size] = table[np.arange(size), letters].all(axis=1)
+    elif size == 0:
+        matches[same_size] = True
+
+    return matches
+
+
+def match_pattern(column_values, reg_exp):
+    '''
+    Returns a boolean array saying which column values match the regular expression reg_exp.
+    Each distinct value is only checked once.
+    '''
+
+    codes, uniques = pd.factorize(pd.Series(column_values, dtype=object))
+    return match_uniques(uniques, reg_exp)[codes]
+
+
+def length_rules(columns, minimums, maximums, min_perc, max_perc):
+    '''
+    CONF3 rules of the columns, from the minimum and maximum length of the values (as text) of each column.
+    '''
+
+    res3 = []
+
+    for column, minimum, maximum in zip(columns, minimums, maximums):
+
+        p = 100
+        if check_perc(p, min_perc, max_perc):
+            res3.append(Rule("CONF3", [column], [minimum, maximum], p))
+
+    return res3
 
-        if len(value) == len(r):  # it only checks if the value matches the regular expression if they have the
-            # same size
 
-            for i in range(len(value)):  # compare letter by letter to regular expression and column value
+def range_rules(columns, minimums, maximums, min_perc, max_perc):
+    '''
+    CONF4 rules of the numeric columns, from the minimum and maximum value of each column.
+    '''
+
+    res4 = []
+
+    for column, minimum, maximum in zip(columns, minimums, maximums):
+
+        p = 100
+        if check_perc(p, min_perc, max_perc):
+            res4.append(Rule("CONF4", [column], [minimum, maximum], p))
+
+    return res4
 
-                if ord(value[i]) >= 48 and ord(value[i]) <= 57:  # se for um número entre 0 e 9
-                    if value[i] == r[i] or r[i] == "N" or r[i] == "*":
-                        check_letter += 1
 
-                if (ord(value[i]) >= 65 and ord(value[i]) <= 90) or (ord(value[i]) >= 97 and ord(value[i]) <= 122):
-                    if value[i] == r[i] or r[i] == "C" or r[i] == "*":
-                        check_letter += 1
+def check_pattern(column_values, miss_values, reg_exp, counts=None):
+    '''
+    Returns which \% of column values that match the regular expression reg_exp.
+    If counts is given, column_values are distinct values and counts[i] is the number of times value i is repeated.
+    '''
 
-            if check_letter == len(value):
-                count += 1
+    if counts is None:
+        count = match_pattern(column_values, reg_exp).sum()  # number of words that match the expression in the column
+        total = len(column_values)
+    else:
+        count = counts[match_uniques(column_values, reg_exp)].sum()
+        total = counts.sum()
 
-    percentage = count / (len(column_values) + miss_values) * 100
+    percentage = count / (total + miss_values) * 100
     return percentage
 
 
-def conf(dataframe, min_perc, max_perc):
+def conf(dataframe, min_perc, max_perc, sample=None):
     '''
     Receives a dataframe and returns a list of tuples (column, regular expression).
+    sample is passed to long_substr, to find the common pattern of each column in a sample of its values.
     '''
 
-    dataframe = dataframe.astype(str)  # to be able to compare when values are numbers
-    dataframe = dataframe.replace(r'^\s*$', np.NaN, regex=True)
+    profile = get_profile(dataframe)
     rules = []
     lines = []
 
+    rows = np.ones(profile.n_rows, dtype=bool)  # rows that are kept, rows with blank values are dropped
+
     for column in dataframe.columns:
-        missing_values = dataframe[column].isna().sum()
-        dataframe = dataframe.dropna(how='any', subset=[column])
-        values = dataframe[column].to_list()  # column values
-        pattern = long_substr(values)  # common pattern for the entire column
+        codes, uniques = profile[column].view(text=True)  # to be able to compare when values are numbers
+        missing_values = (codes[rows] == -1).sum()
+        rows &= codes != -1
+
+        # the patterns are computed once for each distinct value, and weighted by the number of times it's repeated
+        counts = np.bincount(codes[rows], minlength=len(uniques))
+        present = np.flatnonzero(counts)
+        values = uniques[present].tolist()  # distinct column values
+        counts = counts[present]
+
+        pattern = long_substr(values, sample)  # common pattern for the entire column
 
         patterns = []  # list that stores all possible patterns of each column at each iteration
 
@@ -468,86 +1156,90 @@ def conf(dataframe, min_perc, max_perc):
             else:
                 r = hipoteses[0]
 
-            percentage = check_pattern(values, missing_values, r)
-            line = "" + column + " has pattern " + str(r) + ": " + str(percentage) + "%"
+            percentage = check_pattern(values, missing_values, r, counts)
             if check_perc(percentage, min_perc, max_perc):
-                lines.append(line)
+                lines.append(Rule("CONF1", [column], [r], percentage, support=counts.sum() + missing_values))
                 rules.append((column, r))
 
     return rules, lines
 
 
-def conformity(dataframe, min_perc, max_perc):
+def iter_conf2(dataframe, patterns, lines, min_perc, max_perc, progress=None, part=None):
     '''
-    Output: res1,res2,res3,res4,res5
+    Yields the CONF2 rules of conformity one at a time (see iter_consistency). patterns and lines are the
+    (column, regular expression) and the rules of CONF1 (see conf).
     '''
 
-    # CONF1:
-    d, res1 = conf(dataframe, min_perc, max_perc)
+    profile = get_profile(dataframe)
 
-    # CONF2:
-    res2 = []
-    dataframe2 = dataframe.astype(str)
-    dataframe2 = dataframe2.replace(r'^\s*$', 'blank', regex=True)  # replace " " with blank
+    # the values are compared as text, with " " replaced by blank
+    views = {column: profile[column].view(blank='blank', text=True) for column in dataframe.columns}
 
     # remove columns that only have single values
-    uniques = getUniqueColumns(dataframe2)
-    dfWithoutUniques = dataframe2.drop(columns=uniques)
+    uniques = [column for column in dataframe.columns if len(views[column][1]) == profile.n_rows]
+    columns = [column for column in dataframe.columns if column not in uniques]
+    columns = columns[part_slice(len(columns), part)]
+
+    # which rows match each CONF1 rule, computed only once for each rule
+    masks = pd.DataFrame({i: match_uniques(views[column2][1], exp)[views[column2][0]]
+                          for i, (column2, exp) in enumerate(patterns)})
+
+    for n, column1 in enumerate(columns):
+        report(progress, n * len(patterns), len(columns) * len(patterns))
+        codes, column1_values = views[column1]
+
+        # % of the rows of each value of column1 that match each rule (one line per value, one column per rule)
+        rates = masks.groupby(codes).mean().to_numpy() if len(patterns) > 0 else None
+        sizes = np.bincount(codes, minlength=len(column1_values))
 
-    for column1 in dfWithoutUniques.columns:
-        column1_values = list(set(dfWithoutUniques[column1].tolist()))
+        column1_values = column1_values.tolist()
 
-        for par in d:
-            column2 = par[0]
-            exp = par[1]
+        for i, (column2, exp) in enumerate(patterns):
 
             if column1 != column2:
-                for valor in column1_values:
-                    df = dataframe2[dataframe2[column1] == valor]
-                    mv = df[column2].isna().sum()
-                    df = df.dropna(how='any', subset=[column2])
-                    column2_values = df[column2].tolist()
-
-                    p = check_pattern(column2_values, mv, exp)
-                    res = "" + "When " + column1 + " equal to " + str(valor) + " then " \
-                          + column2 + " has pattern " + str(exp) + ": " + str(p) + "%"
-                    if check_perc(p, min_perc, max_perc):
-                        res2.append(res)
+                p = rates[:, i] * 100
+                for code in np.flatnonzero((p >= min_perc) & (p <= max_perc)):
+                    # only kept while the CONF1 rule is kept
+                    yield Rule("CONF2", [column1, column2], [column1_values[code], exp], p[code], depends=lines[i],
+                               support=sizes[code], given=column1)
 
-    # CONF3:
-    res3 = []
+    report(progress, len(columns) * len(patterns), len(columns) * len(patterns))
 
-    for column in dataframe.columns:
-        values = dataframe[column].tolist()
-        lengths = [len(str(value)) for value in values]
-        minimum = min(lengths)
-        maximum = max(lengths)
 
-        p = 100
-        res = "" + column + " length ranges between " + str(minimum) + " & " + str(maximum) + ": 100 %"
-        if check_perc(p, min_perc, max_perc):
-            res3.append(res)
+def conformity(dataframe, min_perc, max_perc, progress=None, part=None):
+    '''
+    Output: res1,res2,res3,res4,res5
+    progress is called with the number of pairs of columns (CONF2) done and the total.
+    part is (index, count) to generate only a part of the CONF2 rules (see part_slice). The CONF1 rules are needed
+    by every part, but only the first part returns them.
+    '''
 
-    # CONF4:
-    res4 = []
+    # CONF1:
+    d, res1 = conf(dataframe, min_perc, max_perc)
 
-    df = dataframe.select_dtypes(include=['number'])  # dataframe whose attributes are numeric
+    # CONF2:
+    res2 = list(iter_conf2(dataframe, d, res1, min_perc, max_perc, progress, part))
 
-    if len(df) > 0:
+    if not first_part(part):
+        return [], res2, [], [], []
 
-        for column in df.columns:
-            values = dataframe[column].tolist()
-            minimum = min(values)
-            maximum = max(values)
+    profile = get_profile(dataframe)
 
-            p = 100
-            res = "" + column + " value ranges between " + str(minimum) + " & " + str(maximum) + ": 100 %"
-            if check_perc(p, min_perc, max_perc):
-                res4.append(res)
+    # CONF3:
+    lengths = [[len(str(value)) for value in profile[column].raw_uniques] for column in dataframe.columns]
+    res3 = length_rules(dataframe.columns, [min(l) for l in lengths], [max(l) for l in lengths], min_perc, max_perc)
+
+    # CONF4:
+    df = dataframe.select_dtypes(include=['number'])  # dataframe whose attributes are numeric
+
+    if len(df) > 0:
+        values = [dataframe[column].tolist() for column in df.columns]
+        res4 = range_rules(df.columns, [min(v) for v in values], [max(v) for v in values], min_perc, max_perc)
 
     else:
+        res4 = []
         res = "This dataframe doesn't contain columns with numeric values."
-        res4.append(res)
+        res4.append(Rule("MESSAGE", values=[res]))
 
     # CONF5:
     res5 = []
@@ -560,30 +1252,48 @@ def conformity(dataframe, min_perc, max_perc):
             b = len(dataframe[column])
 
             if a == b:  # so there are no numeric values, they are all nominal
-                res = "" + column + " contains nominal values: 100 %"
                 p = 100
                 if check_perc(p, min_perc, max_perc):
-                    res5.append(res)
+                    res5.append(Rule("CONF5", [column], ["nominal"], p, support=b))
 
             elif a >= (b / 2):  # half or more than half of the values are nominal
-                res = "" + column + " contains nominal values: " + str(a / b * 100) + "%"
                 if check_perc(a / b * 100, min_perc, max_perc):
-                    res5.append(res)
+                    res5.append(Rule("CONF5", [column], ["nominal"], a / b * 100, support=b))
 
             else:  # more than half of the values are numeric
-                res = "" + column + " contains numeric values: " + str((b - a) / b * 100) + "%"
                 if check_perc((b - a) / b * 100, min_perc, max_perc):
-                    res5.append(res)
+                    res5.append(Rule("CONF5", [column], ["numeric"], (b - a) / b * 100, support=b))
 
         elif dataframe[column].dtypes == 'int64':
-            res = "" + column + " contains numeric values: 100%"
             p = 100
             if check_perc(p, min_perc, max_perc):
-                res5.append(res)
+                res5.append(Rule("CONF5", [column], ["numeric"], p, support=len(dataframe[column])))
 
     return res1, res2, res3, res4, res5
 
 
+def summary_rules(summary, min_perc, max_perc):
+    '''
+    Returns the COMP1, CONF3 and CONF4 rules of a dataset from its summary (profiling.StreamProfile), that is
+    computed while the dataset is read, without reading the dataset again.
+    '''
+
+    if summary.n_rows == 0:  # the rules are percentages of the rows
+        return [], [], [Rule("MESSAGE", values=["This dataframe doesn't contain columns with numeric values."])]
+
+    columns = [summary[column] for column in summary.columns]
+
+    res1 = populated_rules(summary.columns, summary.n_rows, [c.null_count for c in columns], min_perc, max_perc)
+    res3 = length_rules(summary.columns, [c.min_length for c in columns], [c.max_length for c in columns],
+                        min_perc, max_perc)
+
+    numeric = [c for c in columns if c.numeric]
+    res4 = range_rules([c.name for c in numeric], [c.value_range()[0] for c in numeric],
+                       [c.value_range()[1] for c in numeric], min_perc, max_perc)
+
+    return res1, res3, res4
+
+
 def display_results(dimension_name, rule_number, results):
     '''
     Takes the name of the dimension, a list of rule numbers and a list of the results of that rule, and
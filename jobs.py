@@ -0,0 +1,348 @@
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+import dimensions
+import sampling
+from dimensions import merge_parts, merge_changed
+from cache import filter_results, iter_results
+from datastore import DatasetStore
+
+
+DIMENSIONS = ("integrity", "completeness", "consistency", "uniqueness", "relevancy", "conformity")
+MAX_JOBS = 256  # number of finished jobs that are remembered
+PROGRESS_INTERVAL = 0.5  # seconds between two updates of the progress of a job
+PART_SIZE = 2000000  # minimum number of values compared (rows x pairs of columns) to give a part to a worker
+
+
+class JobCancelled(Exception):
+    '''
+    Raised inside a worker to stop a dimension when its job is cancelled.
+    '''
+
+
+class Progress:
+    '''
+    Progress function given to the dimensions in the workers. Keeps (done, total) of a part of the job in the
+    shared dictionary and stops the dimension (raises JobCancelled) if the job was cancelled. The shared
+    dictionary lives in another process, so it's only used once in a while.
+    '''
+
+    def __init__(self, shared, job_id, part=0, interval=PROGRESS_INTERVAL):
+        self.shared = shared
+        self.job_id = job_id
+        self.part = part
+        self.interval = interval
+        self.last = 0
+
+    def __call__(self, done, total):
+        now = time.monotonic()
+        if now - self.last < self.interval and done < total:
+            return
+        self.last = now
+
+        if self.shared.get(("cancel", self.job_id)):
+            raise JobCancelled(self.job_id)
+        self.shared[self.job_id, self.part] = (int(done), int(total))
+
+
+_stores = {}  # folder -> store of the worker, so the dataframes are kept between jobs
+
+
+def load(folder, datasets):
+    if folder not in _stores:
+        _stores[folder] = DatasetStore(folder)
+    return [_stores[folder].get(dataset_id, version) for dataset_id, version in datasets]
+
+
+def run_dimension(name, folder, datasets, min_perc, max_perc, args, shared, job_id, part=None, options=None,
+                  only=None):
+    '''
+    Runs a dimension (or a part of it, see dimensions.part_slice) in a worker. The dataframes are read from the
+    store (memory-mapped) instead of being sent to the worker, and the profile of a dataframe is reused by all
+    the parts that run in the same worker. If options are given, the dimension runs on a sample of the rows
+    (options are the arguments of sampling.approximate). If only is given, only the rules about those columns are
+    generated (see dimensions.merge_changed).
+    '''
+
+    dataframes = load(folder, datasets)
+    dimension = getattr(dimensions, name)
+    progress = Progress(shared, job_id, 0 if part is None else part[0])
+
+    if options:
+        return sampling.approximate(dimension, dataframes, min_perc, max_perc, *args, progress=progress, part=part,
+                                    **options)
+    if only is not None:
+        return dimension(*dataframes, *args, min_perc, max_perc, progress=progress, part=part, only=only)
+    return dimension(*dataframes, *args, min_perc, max_perc, progress=progress, part=part)
+
+
+def run_verification(name, folder, datasets, results, args, shared, job_id):
+    '''
+    Computes again with all the rows the rules of results, found in a sample (see sampling.verify).
+    '''
+
+    dataframes = load(folder, datasets)
+    dimension = getattr(dimensions, name)
+    return sampling.verify(dimension, dataframes, results, *args, progress=Progress(shared, job_id))
+
+
+class Job:
+    '''
+    A run of a dimension: the futures of its parts in the pool, or the results if they are already known.
+    '''
+
+    def __init__(self, job_id, dataset, min_perc, max_perc, futures=(), results=None, dimension=None, datasets=(),
+                 args=(), parent=None, columns=()):
+        self.id = job_id
+        self.dataset = dataset
+        self.dimension = dimension
+        self.datasets = list(datasets)
+        self.args = args
+        self.min_perc = min_perc
+        self.max_perc = max_perc
+        self.futures = list(futures)
+        self.results = results
+        self.parent = parent  # (results of the previous version, changed columns), see ResultCache.parent
+        self.columns = list(columns)
+        self.cancelled = False
+
+    def done(self):
+        return all(future.done() for future in self.futures)
+
+    def failed(self):
+        return any(future.cancelled() or future.exception() is not None for future in self.futures if future.done())
+
+
+class JobManager:
+    '''
+    Runs the dimensions in a pool of processes, so the web requests don't wait for them.
+    Every job has an id that is used to follow its progress, get the results or cancel it. The results of the
+    jobs are kept in the result cache, and a dimension that is already running for the same dataset and range
+    of percentages isn't submitted again. Large datasets are divided in parts (chunks of pairs of columns) that
+    run in different workers.
+    '''
+
+    def __init__(self, store, results, workers=None):
+        self.store = store
+        self.results = results
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = None
+        self._shared = None
+        self._jobs = OrderedDict()  # job id -> job
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        if self._executor is None:
+            self._shared = multiprocessing.Manager().dict()
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def executor(self):
+        '''
+        Returns the pool of processes of the jobs, to run other work in it (for example, training the models of
+        cleansing.cleansing_batch).
+        '''
+
+        return self._pool()
+
+    def _forget(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done()]
+        for job_id in finished[:max(0, len(finished) - MAX_JOBS)]:
+            job = self._jobs.pop(job_id)
+            if self._shared is not None:
+                for part in range(len(job.futures)):
+                    self._shared.pop((job_id, part), None)
+                self._shared.pop(("cancel", job_id), None)
+
+    def parts(self, dataframes):
+        '''
+        Returns the number of parts in which a dimension is divided for the dataframes, so that every part has
+        at least PART_SIZE values to compare and there are no more parts than workers.
+        '''
+
+        n_rows = max(len(dataframe) for dataframe in dataframes)
+        n_columns = max(len(dataframe.columns) for dataframe in dataframes)
+        work = n_rows * n_columns * (n_columns - 1)
+        return int(max(1, min(self.workers, work // PART_SIZE)))
+
+    def submit(self, dimension, datasets, min_perc, max_perc, *args, options=None):
+        '''
+        Submits a dimension (its name) for the datasets of the store (a list of (dataset_id, version)) and returns
+        the id of the job. If the results are in the cache the job is already done. options are the arguments of
+        sampling.approximate, to find the rules in a sample of the rows.
+        '''
+
+        if dimension not in DIMENSIONS:
+            raise KeyError(dimension)
+
+        dataframes = [self.store.get(dataset_id, version) for dataset_id, version in datasets]
+        dataset = self.results.dataset(dimension, dataframes, args, options)
+        datasets = [(dataset_id, int(version)) for dataset_id, version in datasets]
+
+        submitted = None
+        with self._lock:
+            # the same dimension already running
+            for job in self._jobs.values():
+                if (job.dataset, job.min_perc, job.max_perc) == (dataset, min_perc, max_perc) \
+                        and not job.done() and not job.cancelled:
+                    return job.id
+
+            job_id = uuid.uuid4().hex
+            results = self.results.get(dataset, min_perc, max_perc, copy=False)  # the jobs don't change them
+            if results is not None:
+                self._jobs[job_id] = Job(job_id, dataset, min_perc, max_perc, results=results, dimension=dimension,
+                                         datasets=datasets, args=args)
+            else:
+                # a version with a few changed columns only generates again the rules about them
+                parent = self.results.parent(dimension, dataframes, min_perc, max_perc, args, options)
+                only = parent[1] if parent is not None else None
+
+                count = 1 if options else self.parts(dataframes)  # a sample is small enough for one worker
+                futures = [self._pool().submit(run_dimension, dimension, self.store.folder, datasets,
+                                               min_perc, max_perc, args, self._shared, job_id, (part, count),
+                                               options, only)
+                           for part in range(count)]
+
+                job = Job(job_id, dataset, min_perc, max_perc, futures=futures, dimension=dimension,
+                          datasets=datasets, args=args, parent=parent, columns=dataframes[0].columns)
+                self._jobs[job_id] = submitted = job
+
+            self._forget()
+
+        if submitted is not None:
+            self._watch(submitted)
+        return job_id
+
+    def submit_all(self, datasets, min_perc, max_perc, other=None, options=None):
+        '''
+        Submits all the dimensions for the datasets at once (relevancy only if the other datasets are given,
+        comparing them as table1 and table2). The parts of all the dimensions share the pool. Returns a dictionary
+        with the id of the job of each dimension.
+        '''
+
+        jobs = {}
+        for dimension in DIMENSIONS:
+            if dimension == "relevancy":
+                if other is not None:
+                    jobs[dimension] = self.submit(dimension, list(datasets) + list(other), min_perc, max_perc,
+                                                  "table1", "table2", options=options)
+            else:
+                jobs[dimension] = self.submit(dimension, datasets, min_perc, max_perc, options=options)
+        return jobs
+
+    def verify(self, job_id):
+        '''
+        Submits a job that computes again, with all the rows, the rules kept by a job that used a sample
+        (see sampling.verify), and returns its id. The results of the verification aren't kept in the cache.
+        '''
+
+        job = self._jobs[job_id]
+        results = self.result(job_id)
+        if results is None:
+            raise ValueError("the job " + job_id + " isn't done")
+
+        with self._lock:
+            verification_id = uuid.uuid4().hex
+            future = self._pool().submit(run_verification, job.dimension, self.store.folder, job.datasets, results,
+                                         job.args, self._shared, verification_id)
+            verification = Job(verification_id, None, job.min_perc, job.max_perc, futures=[future],
+                               dimension=job.dimension, datasets=job.datasets, args=job.args)
+            self._jobs[verification_id] = verification
+            self._forget()
+
+        self._watch(verification)
+        return verification_id
+
+    def _watch(self, job):
+        '''
+        Merges the results of the job when its parts are done. Called without holding the lock: the callback of a
+        future that is already done runs at once in this thread, and _merge takes the lock.
+        '''
+
+        for future in job.futures:
+            future.add_done_callback(lambda future, job=job: self._merge(job))
+
+    def _merge(self, job):
+        '''
+        Joins the results of the parts of a job when all of them are done, and keeps them in the result cache.
+        '''
+
+        if not job.done() or job.failed():
+            return
+        with self._lock:
+            if job.results is None:
+                job.results = merge_parts([future.result() for future in job.futures])
+                if job.parent is not None:
+                    job.results = merge_changed(job.parent[0], job.results, job.columns, job.parent[1])
+                if job.dataset is not None:
+                    self.results.put(job.dataset, job.min_perc, job.max_perc, job.results)
+
+    def status(self, job_id):
+        '''
+        Returns a dictionary with the status of the job (pending, running, done, cancelled or failed) and
+        the number of pairs of columns done and the total.
+        '''
+
+        job = self._jobs[job_id]
+        done, total = 0, 0
+
+        errors = [future.exception() for future in job.futures if future.done() and not future.cancelled()]
+        if job.cancelled or any(future.cancelled() for future in job.futures) \
+                or any(isinstance(error, JobCancelled) for error in errors):
+            status = "cancelled"
+        elif any(error is not None for error in errors):
+            status = "failed"
+        elif job.done():
+            status = "done"
+        elif any(future.running() or future.done() for future in job.futures):
+            status = "running"
+        else:
+            status = "pending"
+
+        if status in ("running", "done"):
+            for part in range(len(job.futures)):
+                part_done, part_total = self._shared.get((job_id, part), (0, 0))
+                done += part_done
+                total += part_total
+
+        return {"job": job_id, "dimension": job.dimension, "status": status, "done": done, "total": total}
+
+    def result(self, job_id):
+        '''
+        Returns a copy of the results of the job, or None if it isn't done.
+        '''
+
+        job = self._jobs[job_id]
+        self._merge(job)  # the callbacks may not have run yet
+        if job.results is None:
+            return None
+        return filter_results(job.results, job.min_perc, job.max_perc)
+
+    def iter_result(self, job_id):
+        '''
+        Same as result, but the rules are read from the results of the job (generators, see cache.iter_results)
+        instead of copied, so a few of millions of rules can be read without copying all of them.
+        '''
+
+        job = self._jobs[job_id]
+        self._merge(job)
+        if job.results is None:
+            return None
+        return iter_results(job.results, job.min_perc, job.max_perc)
+
+    def cancel(self, job_id):
+        '''
+        Cancels the job. A job that is already running stops the next time it reports its progress.
+        '''
+
+        job = self._jobs[job_id]
+        if not job.done():
+            job.cancelled = True
+            self._shared[("cancel", job_id)] = True
+            for future in job.futures:
+                future.cancel()  # the parts that haven't started
+        return self.status(job_id)
@@ -0,0 +1,108 @@
+from collections import OrderedDict
+import hashlib
+import os
+import shutil
+import joblib
+
+
+MODELS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+MAX_MODELS = 8  # number of trained models kept in memory
+FORMAT = 2  # version of the saved imputers, the ones saved with other versions aren't read
+
+
+class Imputer:
+    '''
+    A model trained to fill the rows that don't follow a rule, with its predictions: rows are the positions (from 0)
+    in the dataframe of the rows to fill and predictions the values predicted for them, in the same order. backend
+    is the name of the kind of model (see cleansing.IMPUTERS) and report has the times and accuracy of the backends
+    that were tried.
+    '''
+
+    def __init__(self, model, rows, predictions, backend=None, report=()):
+        self.model = model
+        self.rows = rows
+        self.predictions = predictions
+        self.backend = backend
+        self.report = list(report)
+
+
+class ModelCache:
+    '''
+    Cache of the models trained by the cleansing functions, by (dataset id, version, rule, encoding, model options).
+
+    Models are kept in memory in a LRU with a maximum number of entries, and also on disk with joblib (if folder
+    isn't None), in a folder for each version of a dataset, so the models of the old versions of a dataset can be
+    removed at once (see forget).
+    '''
+
+    def __init__(self, folder=MODELS_FOLDER, max_entries=MAX_MODELS):
+        self.folder = folder
+        self.max_entries = max_entries
+        self._models = OrderedDict()  # key -> imputer
+
+        if folder is not None:
+            os.makedirs(folder, exist_ok=True)
+
+    def key(self, dataset, rule, encoding, options):
+        '''
+        Returns the key of the model of a rule (see Rule.id) for a dataset (dataset id, version), trained with the
+        encoding and the options of the model.
+        '''
+
+        dataset_id, version = dataset
+        return dataset_id, int(version), rule.id, encoding, tuple(sorted(options.items())), FORMAT
+
+    def _path(self, key):
+        dataset_id, version = key[:2]
+        name = hashlib.sha1(repr(key).encode()).hexdigest() + ".joblib"
+        return os.path.join(self.folder, dataset_id, "v" + str(version), name)
+
+    def get(self, key):
+        '''
+        Returns the imputer of the key, or None if it isn't in the cache.
+        '''
+
+        if key in self._models:
+            self._models.move_to_end(key)
+            return self._models[key]
+
+        if self.folder is not None and os.path.exists(self._path(key)):
+            imputer = joblib.load(self._path(key))
+            self._remember(key, imputer)
+            return imputer
+
+        return None
+
+    def put(self, key, imputer):
+        '''
+        Keeps the imputer of the key.
+        '''
+
+        self._remember(key, imputer)
+
+        if self.folder is not None:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            joblib.dump(imputer, path + ".tmp")
+            os.replace(path + ".tmp", path)
+
+    def _remember(self, key, imputer):
+        self._models[key] = imputer
+        self._models.move_to_end(key)
+        while len(self._models) > self.max_entries:
+            self._models.popitem(last=False)
+
+    def forget(self, dataset_id, keep=None):
+        '''
+        Removes the models of all the versions of a dataset except the version keep (for example, when a new
+        version replaces the dataset, the models of the old ones are no longer used).
+        '''
+
+        for key in [key for key in self._models if key[0] == dataset_id and key[1] != keep]:
+            del self._models[key]
+
+        folder = os.path.join(self.folder, dataset_id) if self.folder is not None else None
+        if folder is not None and os.path.isdir(folder):
+            for name in os.listdir(folder):
+                if keep is None or name != "v" + str(int(keep)):
+                    shutil.rmtree(os.path.join(folder, name), ignore_errors=True)
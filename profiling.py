@@ -0,0 +1,325 @@
+from collections import OrderedDict
+import hashlib
+import weakref
+import pandas as pd
+import numpy as np
+
+
+PROFILE_CACHE_SIZE = 8  # number of dataset profiles kept in memory
+SKETCH_SIZE = 1024  # number of hashes kept to estimate the number of distinct values of a column that is streamed
+
+
+def is_blank(value):
+    '''
+    Returns True if the value is a string with only white space (the values matched by r'^\s*$').
+    '''
+
+    return isinstance(value, str) and (value == "" or value.isspace())
+
+
+class ColumnProfile:
+    '''
+    Precomputed information about one column of a dataframe.
+
+    The column is factorized only once and every other view (blank-normalised, text, blank labelled) is
+    derived from the distinct values, so the cost of the derivations depends on the cardinality of the
+    column and not on the number of rows.
+    '''
+
+    def __init__(self, name, series):
+        self.name = name
+        self.series = series
+        self.n_rows = len(series)
+
+        # raw codes: NaN is a value like any other (the same as drop_duplicates)
+        raw_codes, raw_uniques = series.factorize(use_na_sentinel=False)
+        self.raw_codes = raw_codes.astype(np.int32)
+        self.raw_uniques = np.asarray(raw_uniques, dtype=object)
+        self.raw_counts = np.bincount(self.raw_codes, minlength=len(self.raw_uniques))
+        self.raw_is_unique = len(self.raw_uniques) == self.n_rows
+
+        # blank[i] is True if the distinct value i is a string with only white space
+        if series.dtype == object:
+            self.blank = np.array([is_blank(v) for v in self.raw_uniques], dtype=bool)
+        else:
+            self.blank = np.zeros(len(self.raw_uniques), dtype=bool)
+
+        # blank-normalised codes: blanks and NaN are missing (-1)
+        missing = self.blank | pd.isna(self.raw_uniques)
+        self.codes, self.uniques = self._derive(self.raw_uniques, missing)
+        self.null_mask = self.codes == -1
+        self.null_count = int(self.null_mask.sum())
+        self.counts = np.bincount(self.codes[~self.null_mask], minlength=len(self.uniques))
+        self.is_unique = (len(self.counts) == 0 or self.counts.max() <= 1) and self.null_count <= 1
+
+        self._views = {}
+        self._index = None
+
+    def _derive(self, labels, missing):
+        '''
+        Factorizes the labels of the distinct values and maps the raw codes to the new codes.
+        Distinct values marked as missing get the code -1.
+        '''
+
+        mapping = np.full(len(labels), -1, dtype=np.int32)
+        new_codes, uniques = pd.factorize(np.asarray(labels, dtype=object)[~missing], use_na_sentinel=False)
+        mapping[~missing] = new_codes
+        return mapping[self.raw_codes], np.asarray(uniques, dtype=object)
+
+    @property
+    def index(self):
+        '''
+        Hash index of the distinct values of the column (NaN included), to find values of other columns.
+        '''
+
+        if self._index is None:
+            self._index = pd.Index(self.raw_uniques, dtype=object)
+        return self._index
+
+    def view(self, blank=None, text=False):
+        '''
+        Returns (codes, uniques) of the column after converting the values to text (if text is True, the same as
+        astype(str)) and replacing blank values by blank. If blank is None the blank values are missing (-1).
+        '''
+
+        key = (blank, text)
+        if key not in self._views:
+            if text:  # with the dtype of the column, so dates are converted like the column (not str(Timestamp))
+                labels = list(pd.Series(self.raw_uniques, dtype=self.series.dtype).astype(str))
+            else:
+                labels = list(self.raw_uniques)
+            missing = np.zeros(len(labels), dtype=bool)
+
+            if not text:
+                missing |= pd.isna(self.raw_uniques)
+
+            if blank is None:
+                missing |= self.blank
+            else:
+                for i in np.flatnonzero(self.blank):
+                    labels[i] = blank
+
+            self._views[key] = self._derive(labels, missing)
+        return self._views[key]
+
+
+class DatasetProfile:
+    '''
+    Profile of a dataframe: one ColumnProfile per column, computed the first time the column is used.
+    If the dataframe is a version of a dataset made from another one (parent, its key) by changing some values,
+    changed has the columns that are different. The other columns reuse the parent's profile only if it is still
+    in the cache of this process (see get_profile), otherwise they are profiled again.
+    '''
+
+    def __init__(self, dataframe, key=None, parent=None, changed=()):
+        self.dataframe = dataframe
+        self.key = key
+        self.columns = list(dataframe.columns)
+        self.n_rows = len(dataframe)
+        self.parent = parent
+        self.changed = frozenset(changed)
+        self._columns = {}
+
+    def inherit(self, profile):
+        '''
+        Reuses the columns already computed in the profile of the parent that haven't changed.
+        '''
+
+        for column, column_profile in profile._columns.items():
+            if column in self.columns and column not in self.changed and column not in self._columns:
+                self._columns[column] = column_profile
+
+    def __getitem__(self, column):
+        if column not in self._columns:
+            self._columns[column] = ColumnProfile(column, self.dataframe[column])
+        return self._columns[column]
+
+    def unique_columns(self, columns=None, raw=False):
+        '''
+        Returns the columns that only have single values (after replacing blank values by NaN, unless raw is True).
+        '''
+
+        columns = self.columns if columns is None else columns
+        if raw:
+            return [column for column in columns if self[column].raw_is_unique]
+        return [column for column in columns if self[column].is_unique]
+
+
+def common_dtype(dtype1, dtype2):
+    '''
+    Returns the dtype of a column made of parts with the two dtypes (the same as pd.concat): numbers are widened
+    (int to float) and anything else becomes object.
+    '''
+
+    if dtype1 is None or dtype1 == dtype2:
+        return dtype2
+    if dtype1.kind in "iuf" and dtype2.kind in "iuf":
+        return np.result_type(dtype1, dtype2)
+    return np.dtype(object)
+
+
+class ColumnSummary:
+    '''
+    Summary of a column that is read in chunks (see StreamProfile): number of missing values (NaN or blank),
+    range of the lengths of the values as text, first, minimum and maximum values and a sketch of the distinct
+    values (the SKETCH_SIZE smallest hashes, to estimate their number). Only the distinct values of each chunk are
+    looked at. All the chunks have the same dtype (see datastore.csv_dtypes).
+    '''
+
+    def __init__(self, name, sketch_size=SKETCH_SIZE):
+        self.name = name
+        self.sketch_size = sketch_size
+        self.dtype = None
+        self.null_count = 0
+        self.lengths = None  # (minimum, maximum) length
+        self.first = None
+        self.minimum = None
+        self.maximum = None
+        self.sketch = np.array([], dtype=np.uint64)
+
+    def update(self, series):
+        '''
+        Adds a chunk of the column.
+        '''
+
+        profile = ColumnProfile(self.name, series)
+        if self.dtype is None and len(series) > 0:
+            self.first = series.iloc[0]
+        self.dtype = common_dtype(self.dtype, series.dtype)
+        self.null_count += profile.null_count
+
+        if len(profile.raw_uniques) > 0:
+            lengths = [len(str(value)) for value in profile.raw_uniques]
+            low, high = self.lengths or (min(lengths), max(lengths))
+            self.lengths = (min(low, min(lengths)), max(high, max(lengths)))
+
+        if series.dtype.kind in "iuf" and series.notna().any():
+            low, high = series.min(), series.max()
+            self.minimum = low if self.minimum is None else min(self.minimum, low)
+            self.maximum = high if self.maximum is None else max(self.maximum, high)
+
+        hashes = pd.util.hash_array(profile.uniques) if len(profile.uniques) > 0 else self.sketch
+        self.sketch = np.union1d(self.sketch, hashes)[:self.sketch_size]
+
+    @property
+    def numeric(self):
+        return self.dtype is not None and self.dtype.kind in "iuf"
+
+    @property
+    def min_length(self):
+        return None if self.lengths is None else self.lengths[0]
+
+    @property
+    def max_length(self):
+        return None if self.lengths is None else self.lengths[1]
+
+    def value_range(self):
+        '''
+        Returns (minimum, maximum) of the column, the same as min and max of the list of values: if the first
+        value is NaN, it's the result of both.
+        '''
+
+        if self.first is None or pd.isna(self.first) or self.minimum is None:
+            return np.nan, np.nan
+        convert = float if self.dtype.kind == "f" else int
+        return convert(self.minimum), convert(self.maximum)
+
+    @property
+    def distinct(self):
+        '''
+        Estimated number of distinct values (exact up to SKETCH_SIZE values).
+        '''
+
+        if len(self.sketch) < self.sketch_size:
+            return len(self.sketch)
+        return int((self.sketch_size - 1) / (float(self.sketch[-1]) / 2 ** 64))
+
+
+class StreamProfile:
+    '''
+    Summary of a dataset that is read in chunks, one ColumnSummary per column, updated with each chunk.
+    '''
+
+    def __init__(self):
+        self.columns = []
+        self.n_rows = 0
+        self._columns = {}
+
+    def __getitem__(self, column):
+        return self._columns[column]
+
+    def update(self, chunk):
+        '''
+        Adds a chunk (a dataframe) of the dataset.
+        '''
+
+        for column in chunk.columns:
+            if column not in self._columns:
+                self.columns.append(column)
+                self._columns[column] = ColumnSummary(column)
+            self._columns[column].update(chunk[column])
+        self.n_rows += len(chunk)
+
+
+def dataset_key(dataframe):
+    '''
+    Returns a hash of the content of the dataframe, used to find its profile in the cache.
+    '''
+
+    h = hashlib.sha1()
+    h.update(repr((list(dataframe.columns), [str(t) for t in dataframe.dtypes], dataframe.shape)).encode())
+    if len(dataframe.columns) > 0:
+        h.update(pd.util.hash_pandas_object(dataframe, index=False).values.tobytes())
+    return h.hexdigest()
+
+
+_profiles = OrderedDict()
+_keys = {}  # id of a dataframe -> (weak reference to the dataframe, key)
+_parents = {}  # key -> (key of the parent, changed columns), see DatasetProfile
+
+
+def register_key(dataframe, key, parent=None, changed=()):
+    '''
+    Associates a key to a dataframe that will not be changed (for example, a version of a stored dataset), so
+    get_profile doesn't have to hash its content. If the dataframe was made from another one (parent is its key)
+    by changing the values of some columns (changed), its profile reuses the other columns of the parent's.
+    '''
+
+    if parent is not None:
+        _parents[key] = (parent, frozenset(changed))
+
+    identifier = id(dataframe)
+
+    def forget(reference):
+        if _keys.get(identifier, (None,))[0] is reference:
+            del _keys[identifier]
+
+    _keys[identifier] = (weakref.ref(dataframe, forget), key)
+
+
+def get_profile(dataframe, key=None):
+    '''
+    Returns the profile of the dataframe. Profiles are kept in a LRU cache, so the same dataset reuses
+    its profile across calls (and across web requests). If key is None, the key registered for the dataframe
+    or the hash of the content is used.
+    '''
+
+    if isinstance(dataframe, DatasetProfile):
+        return dataframe
+
+    if key is None:
+        reference, key = _keys.get(id(dataframe), (None, None))
+        if reference is None or reference() is not dataframe:
+            key = dataset_key(dataframe)
+
+    if key in _profiles:
+        _profiles.move_to_end(key)
+        return _profiles[key]
+
+    profile = DatasetProfile(dataframe, key, *_parents.get(key, (None, ())))
+    if profile.parent in _profiles and _profiles[profile.parent].n_rows == profile.n_rows:
+        profile.inherit(_profiles[profile.parent])
+    _profiles[key] = profile
+    while len(_profiles) > PROFILE_CACHE_SIZE:
+        _profiles.popitem(last=False)
+    return profile
@@ -0,0 +1,148 @@
+import math
+import numpy as np
+import pandas as pd
+import dimensions
+from dimensions import Rule, relevancy_key
+
+
+Z = 1.96  # 95% confidence
+
+
+def wilson_interval(score, support, fraction=0.0, z=Z):
+    '''
+    Returns the Wilson confidence interval (low, high) of a percentage (score) computed with support rows of a
+    sample. fraction is the part of the population that is in the sample (finite population correction): if
+    every row was sampled the interval is the score itself.
+    '''
+
+    if support is None or support == 0 or fraction >= 1:
+        return score, score
+
+    p = score / 100
+    n = support / (1 - fraction)  # the variance of a sample without replacement is smaller by (1 - fraction)
+    center = (p + z * z / (2 * n)) / (1 + z * z / n)
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+
+    return max(0.0, center - half) * 100, min(1.0, center + half) * 100
+
+
+def sample_size(error, z=Z):
+    '''
+    Returns the number of rows needed so that the confidence interval of a percentage is at most +- error
+    percentage points (for the worst case, 50%).
+    '''
+
+    return int(math.ceil(z * z * 0.25 / (error / 100) ** 2))
+
+
+def sample_rows(dataframe, size, by=None, seed=0):
+    '''
+    Returns a sample of the rows of the dataframe (in their original order): size rows chosen uniformly, or
+    if by is a column, up to size rows of each value of by (stratified), so that the rules about the rare
+    values of by have as many rows as the rules about the frequent values.
+    '''
+
+    if by is None:
+        if size >= len(dataframe):
+            return dataframe
+        return dataframe.sample(n=size, random_state=seed).sort_index()
+
+    rng = np.random.default_rng(seed)
+    codes = pd.factorize(dataframe[by])[0]
+    order = rng.permutation(len(dataframe))
+    order = order[np.argsort(codes[order], kind="stable")]  # rows of each value, in a random order
+
+    starts = np.flatnonzero(np.r_[True, codes[order][1:] != codes[order][:-1]])
+    rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+
+    return dataframe.iloc[np.sort(order[rank < size])]
+
+
+def with_interval(rule, fraction, z=Z, depends=None):
+    '''
+    Returns a copy of the rule with the confidence interval of its score (shown in the text as "+- x%").
+    Rules whose score isn't a percentage of rows (no support) are only copied.
+    '''
+
+    if rule.score is None or rule.support is None:
+        return Rule(rule.rule_type, rule.columns, rule.values, rule.score, depends, rule.support, rule.given)
+
+    low, high = wilson_interval(rule.score, int(rule.support), fraction, z)
+    return Rule(rule.rule_type, rule.columns, rule.values, rule.score, depends, int(rule.support), rule.given,
+                (low, high))
+
+
+def approximate(dimension, dataframes, min_perc, max_perc, *args, size=None, error=None, by=None, seed=0, z=Z,
+                **kwargs):
+    '''
+    Runs the dimension on a sample of the rows of the (first) dataframe and returns its results, with the
+    confidence interval of every rule (see with_interval). The sample has size rows, or the rows needed to
+    have intervals of +- error; if by is given the sample is stratified by the column by (see sample_rows) and
+    only the rules with a condition on by are returned.
+    A rule is kept if its interval overlaps the minimum and maximum. The uniqueness rules and the ranges of
+    CONF3 and CONF4 aren't percentages of independent rows, so they have no interval (verify them with verify).
+    The other keyword arguments (progress, part) are passed to the dimension.
+    '''
+
+    if size is None:
+        size = sample_size(error, z)
+
+    dataframe = dataframes[0]
+    sample = sample_rows(dataframe, size, by, seed)
+    fraction = len(sample) / len(dataframe) if len(dataframe) > 0 else 1.0
+
+    if dimension is dimensions.relevancy and kwargs.get("key") is None:
+        kwargs["key"] = relevancy_key(dataframe, dataframes[1])  # a column unique in the sample may not be unique
+
+    results = dimension(sample, *dataframes[1:], *args, 0, 100, **kwargs)
+
+    copies = {}  # id of a rule -> rule with interval, so the rules that depend on it use the copy
+
+    def annotate(rule):
+        if id(rule) not in copies:
+            depends = None if rule.depends is None else annotate(rule.depends)
+            if by is None:
+                rule_fraction = fraction
+            else:  # a stratum with less than size rows was sampled whole
+                rule_fraction = 1.0 if rule.support is not None and rule.support < size else 0.0
+            copies[id(rule)] = with_interval(rule, rule_fraction, z, depends)
+        return copies[id(rule)]
+
+    def keep(rule):
+        return (by is None or rule.given == by) and annotate(rule).passes(min_perc, max_perc)
+
+    if isinstance(results, tuple):
+        return tuple([annotate(rule) for rule in rules if keep(rule)] for rules in results)
+    return [annotate(rule) for rule in results if keep(rule)]
+
+
+def verify(dimension, dataframes, results, *args, **kwargs):
+    '''
+    Computes again, on all the rows, the rules of results (found in a sample), and returns the results with the
+    exact rules. Only the columns of the rules are used (for conformity, also the columns before them, because
+    CONF1 drops the rows with missing values of the previous columns). Rules that aren't found in all the rows
+    are replaced by a rule with no score that says so. The rules are matched by their id (see Rule.id).
+    '''
+
+    dataframe = dataframes[0]
+    flat = results if not isinstance(results, tuple) else [rule for rules in results for rule in rules]
+
+    needed = {column for rule in flat for column in rule.columns}
+    if dimension is dimensions.relevancy:
+        kwargs.setdefault("key", relevancy_key(dataframe, dataframes[1]))
+        needed.add(kwargs["key"])
+
+    columns = [column for column in dataframe.columns if column in needed]
+    if dimension is dimensions.conformity and len(columns) > 0:
+        columns = list(dataframe.columns[:dataframe.columns.get_loc(columns[-1]) + 1])
+
+    exact = dimension(dataframe[columns], *dataframes[1:], *args, 0, 100, **kwargs)
+
+    def replace(rules, exact_rules):
+        found = {rule.id: rule for rule in exact_rules}
+        return [found.get(rule.id, Rule("MESSAGE", rule.columns, [rule.describe() + ": not found in all the rows"]))
+                for rule in rules]
+
+    if isinstance(results, tuple):
+        return tuple(replace(rules, exact_rules) for rules, exact_rules in zip(results, exact))
+    return replace(results, exact)
@@ -0,0 +1,20 @@
+import glob
+import os
+from cache import ResultCache
+
+
+def test_disk_results_are_evicted(tmp_path):
+    # two entries on disk: the results used the longest time ago are removed first
+    folder = str(tmp_path / "results")
+    cache = ResultCache(folder, max_entries=2)
+    cache.put(("a",), 0, 100, [])
+    cache.put(("b",), 0, 100, [])
+    for dataset, used in ((("a",), 1), (("b",), 2)):
+        os.utime(glob.glob(os.path.join(cache._folder(dataset), "*.pkl"))[0], (used, used))
+
+    assert ResultCache(folder, max_entries=2).get(("a",), 0, 100) == []  # a is used again
+    cache.put(("c",), 0, 100, [])
+
+    assert len(glob.glob(os.path.join(folder, "*", "*.pkl"))) == 2
+    assert not os.path.exists(cache._folder(("b",)))
+    assert ResultCache(folder).get(("a",), 0, 100) == []
@@ -0,0 +1,14 @@
+import pandas as pd
+import pytest
+from cleansing import encode_all_labels
+
+
+def test_one_hot_encoding_overlapping_columns():
+    # the category x of a and b would be two columns with the same name, and the category b would be the column b
+    for dataframe in (pd.DataFrame({"a": ["x", "y"], "b": ["x", "z"]}),
+                      pd.DataFrame({"a": ["x", "b"], "b": [1.0, 2.0]})):
+        with pytest.raises(ValueError):
+            encode_all_labels(dataframe, None)
+
+    encoded = encode_all_labels(pd.DataFrame({"a": ["x", "y"], "b": ["u", "z"], "n": [1.0, 2.0]}), None)
+    assert sorted(encoded.columns) == ["n", "u", "x", "y", "z"]
@@ -0,0 +1,29 @@
+import io
+import pandas as pd
+from datastore import DatasetStore
+
+
+def test_put_csv_mixed_column_across_chunks(tmp_path):
+    # the first chunk of the column only has numbers, the second one has text
+    text = "id,code,amount\n" + "".join(str(i) + "," + str(i) + "," + str(i) + "\n" for i in range(6)) \
+        + "6,A7,6.5\n7,,7\n"
+    store = DatasetStore(str(tmp_path / "datasets"))
+    dataset_id, version, summary = store.put_csv(io.BytesIO(text.encode()), chunksize=4)
+
+    dataframe = store.get(dataset_id, version)
+    whole = pd.read_csv(io.BytesIO(text.encode()))
+    pd.testing.assert_frame_equal(dataframe, whole)
+    assert [type(value) for value in dataframe["code"].dropna()] == [str] * 7
+    assert summary.n_rows == 8
+
+
+def test_put_csv_booleans_with_missing_values(tmp_path):
+    # only the second chunk has missing values: the column has True, False and NaN like a whole read
+    text = "id,flag,other\n0,True,True\n1,False,False\n2,True,True\n3,,False\n4,False,True\n"
+    store = DatasetStore(str(tmp_path / "datasets"))
+    dataset_id, version, summary = store.put_csv(io.BytesIO(text.encode()), chunksize=3)
+
+    dataframe = store.get(dataset_id, version)
+    whole = pd.read_csv(io.BytesIO(text.encode()))
+    pd.testing.assert_frame_equal(dataframe, whole)
+    assert dataframe["flag"].tolist()[:3] == [True, False, True] and dataframe["other"].dtype == bool
@@ -0,0 +1,177 @@
+from itertools import combinations
+import numpy as np
+import pandas as pd
+import dimensions
+from profiling import get_profile
+
+
+def frame(seed=0, n=300):
+    '''
+    A small dataframe with repeated values, missing and blank values and columns of different dtypes.
+    '''
+
+    rng = np.random.default_rng(seed)
+    a = rng.integers(0, 5, n)
+    b = a.astype(float)
+    b[rng.random(n) < 0.2] = np.nan
+    e = a.copy()
+    e[rng.random(n) < 0.3] = 7
+    return pd.DataFrame({"a": a, "b": b, "c": rng.choice(["x", "y", " ", "z"], n).astype(object),
+                         "d": rng.choice(["x", "y", "w"], n).astype(object), "e": e,
+                         "f": rng.choice([1.5, 2.5, np.nan], n)})
+
+
+def normalized(dataframe):
+    # blank values are missing, the same as the original dimensions
+    return dataframe.replace(r'^\s*$', np.nan, regex=True)
+
+
+def test_equality_counts():
+    for seed in range(3):
+        dataframe = frame(seed)
+        columns = list(dataframe.columns)
+        counts = dimensions.equality_counts(get_profile(dataframe), columns, tile=2, chunk=64)
+
+        values = normalized(dataframe)
+        for i, j in combinations(range(len(columns)), 2):
+            assert counts[i, j] == (values[columns[i]] == values[columns[j]]).sum()
+
+        # the pairs that can reach min_perc are still counted exactly
+        bounded = dimensions.equality_counts(get_profile(dataframe), columns, min_perc=30)
+        for i, j in combinations(range(len(columns)), 2):
+            if counts[i, j] / len(dataframe) * 100 >= 30:
+                assert bounded[i, j] == counts[i, j]
+
+
+def test_integrity_pairs():
+    # INTE2 the same as comparing the columns with ==
+    dataframe = frame(1)
+    values = normalized(dataframe)
+    expected = [(column1, column2, (values[column1] == values[column2]).sum() / len(values) * 100)
+                for column1, column2 in combinations(values.columns, 2)]
+    _, res2 = dimensions.integrity(dataframe, 0, 100)
+    assert [rule.columns + (rule.score,) for rule in res2] == expected
+
+
+def brute_consistency(dataframe, max_values):
+    # for each value of column1, the most frequent values of column2 (ties in the order they appear)
+    values = normalized(dataframe)
+    columns = [column for column in values.columns
+               if not (values[column].dropna().is_unique and values[column].isna().sum() <= 1)]
+    rules = []
+    for pair in combinations(columns, 2):
+        for column1, column2 in (pair, pair[::-1]):
+            order = {value: i for i, value in enumerate(values[column2].dropna().drop_duplicates())}
+            for value1 in values[column1].dropna().drop_duplicates():
+                rows = values[values[column1] == value1]
+                counts = rows[column2].value_counts()
+                ranked = sorted(counts.index, key=lambda value: (-counts[value], order[value]))[:max_values]
+                for k in range(1, len(ranked) + 1):
+                    p = sum(counts[value] for value in ranked[:k]) / len(rows) * 100
+                    rules.append(((column1, column2), (value1,) + tuple(ranked[:k]), p))
+    return rules
+
+
+def test_consistency():
+    for seed, max_values in [(0, 3), (1, 1), (2, 10)]:
+        dataframe = frame(seed)
+        rules = dimensions.consistency(dataframe, 0, 100, max_values=max_values)
+        assert [(rule.columns, rule.values, rule.score) for rule in rules] == brute_consistency(dataframe, max_values)
+
+
+def test_value_crosstab():
+    dataframe = frame(3)
+    profile = get_profile(dataframe)
+    codes1, codes2, counts = dimensions.value_crosstab(profile, "a", "d")
+    values = normalized(dataframe)
+    expected = values.groupby(["a", "d"]).size()
+    uniques1, uniques2 = profile["a"].uniques, profile["d"].uniques
+    assert {(uniques1[i], uniques2[j]): n for i, j, n in zip(codes1, codes2, counts)} == expected.to_dict()
+    assert list(codes1) == sorted(codes1)
+
+
+def brute_uniqueness(dataframe, max_columns):
+    # the original UNIQ2 (rows that aren't repeated, NaN is a value), skipping the combinations that contain a key
+    columns = [column for column in dataframe.columns if not dataframe[column].is_unique]
+    rules, keys = [], set()
+    for size in range(2, max_columns + 1):
+        for combination in combinations(columns, size):
+            if size > 2 and any(c in keys for c in combinations(combination, size - 1)):
+                keys.add(combination)
+                continue
+            unrepeated = len(dataframe[list(combination)].drop_duplicates(keep=False))
+            if unrepeated == len(dataframe):
+                keys.add(combination)
+            rules.append((combination, unrepeated / len(dataframe) * 100))
+    return rules
+
+
+def test_uniqueness():
+    rng = np.random.default_rng(0)
+    n = 60
+    dataframe = frame(4, n)
+    dataframe["x"], dataframe["y"] = np.arange(n) // 6, (np.arange(n) % 6).astype(float)  # x and y are a key
+    dataframe.loc[rng.choice(n, 5), "y"] = np.nan
+
+    for max_columns in (2, 3):
+        res1, res2 = dimensions.uniqueness(dataframe, 0, 100, max_columns=max_columns)
+        assert [(rule.columns, rule.score) for rule in res2] == brute_uniqueness(dataframe, max_columns)
+    assert (("x", "y"), 100) in [(rule.columns, rule.score) for rule in res2]
+
+    assert [rule.score for rule in res1] == \
+        [len(dataframe[column].drop_duplicates(keep=False)) / n * 100 for column in dataframe.columns]
+
+
+def test_refine_partition():
+    dataframe = frame(5)
+    profile = get_profile(dataframe)
+    codes = dimensions.combination_partition(profile, ["a", "c", "f"])
+    groups = dataframe.groupby(["a", "c", "f"], dropna=False, sort=False).ngroup().to_numpy()
+    assert np.array_equal(codes, groups)
+
+
+def brute_substr(data):
+    # the original long_substr: the intersection of the sets of substrings of every word
+    substrs = lambda x: {x[i:i + j] for i in range(len(x)) for j in range(len(x) - i + 1)}
+    s = substrs(data[0])
+    for val in data[1:]:
+        s.intersection_update(substrs(val))
+    return s
+
+
+def test_common_substr():
+    rng = np.random.default_rng(0)
+    for _ in range(300):
+        data = ["".join(rng.choice(list("abc"), rng.integers(1, 12))) for _ in range(rng.integers(1, 6))]
+        common = brute_substr(data)
+        found = dimensions.common_substr(data)
+        assert found in common and len(found) == max(len(s) for s in common)
+
+        # of the longest ones, the first in the shortest word
+        shortest = [word for word in data if len(word) == min(map(len, data))]
+        if len(set(shortest)) == 1:
+            longest = [s for s in common if len(s) == len(found)]
+            assert found == min(longest, key=shortest[0].find)
+
+
+def flat(results):
+    results = results if isinstance(results, tuple) else (results,)
+    return [[(rule.rule_type, rule.columns, rule.values, rule.score) for rule in rules] for rules in results]
+
+
+def test_merge_changed():
+    old = frame(6)
+    rng = np.random.default_rng(1)
+    for changed in (["c"], ["a", "f"], ["b", "d", "e"]):
+        new = old.copy()
+        for column in changed:
+            rows = rng.choice(len(new), 40, replace=False)
+            new.loc[rows, column] = new[column].sample(40, random_state=0).to_numpy()
+
+        for name in dimensions.INCREMENTAL:
+            dimension = getattr(dimensions, name)
+            for min_perc, max_perc in ((0, 100), (30, 90)):
+                merged = dimensions.merge_changed(dimension(old, min_perc, max_perc),
+                                                  dimension(new, min_perc, max_perc, only=set(changed)),
+                                                  list(new.columns), set(changed))
+                assert flat(merged) == flat(dimension(new, min_perc, max_perc))
@@ -0,0 +1,53 @@
+from concurrent.futures import Executor, Future
+import threading
+import pandas as pd
+from cache import ResultCache
+from datastore import DatasetStore
+from jobs import JobManager
+
+
+class ImmediateExecutor(Executor):
+    '''
+    Runs the work in the calling thread, so the futures are already done when submit returns.
+    '''
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as error:
+            future.set_exception(error)
+        return future
+
+
+def manager(tmp_path):
+    store = DatasetStore(str(tmp_path / "datasets"))
+    jobs = JobManager(store, ResultCache(None), workers=1)
+    jobs._executor = ImmediateExecutor()
+    jobs._shared = {}
+    return store, jobs
+
+
+def run(target):
+    # a deadlock would never return, so the test fails after a timeout instead of hanging
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout=60)
+    assert not thread.is_alive()
+
+
+def test_submit_with_finished_futures(tmp_path):
+    store, jobs = manager(tmp_path)
+    dataset = store.put(pd.DataFrame({"a": [1, 2, 2, 3], "b": ["x", "y", "y", " "]}))
+    done = {}
+
+    def submit():
+        job_id = jobs.submit("completeness", [dataset], 0, 100)
+        done["status"] = jobs.status(job_id)["status"]
+        done["result"] = jobs.result(job_id)
+        done["verification"] = jobs.status(jobs.verify(job_id))["status"]
+
+    run(submit)
+    assert done["status"] == "done"
+    assert done["result"] is not None
+    assert done["verification"] == "done"
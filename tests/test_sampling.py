@@ -0,0 +1,18 @@
+import numpy as np
+import pandas as pd
+import dimensions
+import sampling
+
+
+def test_verify_sampled_integrity():
+    # the values of country appear in another order in the sample than in all the rows
+    countries = ["PT", "ES"] + ["FR"] * 498 + list(np.random.default_rng(0).choice(["ES", "PT", "FR"], 1500))
+    dataframe = pd.DataFrame({"country": countries})
+
+    sampled = sampling.approximate(dimensions.integrity, [dataframe], 0, 100, size=200, seed=1)
+    assert len(sampled[0]) == 1 and sampled[0][0].values[0] != "PT"
+
+    verified = sampling.verify(dimensions.integrity, [dataframe], sampled)
+    exact = dimensions.integrity(dataframe, 0, 100)
+    assert [(rule.rule_type, rule.values, rule.score) for rule in verified[0]] == \
+        [(rule.rule_type, rule.values, rule.score) for rule in exact[0]]
@@ -1,10 +1,15 @@
 
-from flask import Flask, render_template, url_for, request, redirect, session
+from flask import Flask, render_template, url_for, request, redirect, session, jsonify, abort
+from itertools import islice
 import pandas as pd
 import csv
 from pandas.core.frame import DataFrame
-from dimensions import integrity, completeness, consistency, uniqueness, relevancy, conformity
-from cleansing import cleansing_completeness, cleansing_consistency
+from dimensions import completeness, consistency, summary_rules, top_rules
+from cleansing import cleansing_completeness, cleansing_consistency, cleansing_batch, model_key, IMPUTER, IMPUTERS
+from datastore import DatasetStore
+from cache import ResultCache
+from models import ModelCache
+from jobs import JobManager, DIMENSIONS
 from sklearn.neural_network import MLPClassifier
 
 import pandas as pd
@@ -17,6 +22,188 @@ pd.options.display.html.border = 0
 app = Flask(__name__)
 app.secret_key = "hello"
 
+store = DatasetStore()  # the session only has the id and version of the datasets, the data is kept on disk
+results = ResultCache()  # results of the dimensions for each dataset and minimum and maximum values
+jobs = JobManager(store, results)  # the dimensions run in a pool of processes, outside of the web requests
+models = ModelCache()  # models trained by the cleansing functions, for each version of a dataset and rule
+
+PAGE_SIZE = 100  # rules in each page of the rules that can be millions (CONS1 and CONF2)
+SORTS = {"generated": "In the order they were generated",
+         "score-desc": "Highest percentage first",
+         "score-asc": "Lowest percentage first"}
+
+
+def load_data(name='data'):
+    '''
+    Returns the dataframe of the dataset that is in the session with the given name (data, data2 or data_altered).
+    '''
+
+    if name not in session:
+        return DataFrame()
+    dataset_id, version = session[name]
+    return store.get(dataset_id, version)
+
+
+def submit_job(dimension, sampled=True):
+    '''
+    Submits a job for the dimension (its name) with the datasets and the minimum and maximum of the session,
+    and returns the id of the job. Relevancy uses the two datasets. If sampled is False, all the rows are used
+    even if the session has sampling options.
+    '''
+
+    options = session.get('sampling') if sampled else None  # None: all the rows are used
+
+    if dimension == "relevancy":
+        return jobs.submit(dimension, [session['data'], session['data2']], int(session['min_confidence']),
+                           int(session['max_confidence']), "table1", "table2", options=options)
+    return jobs.submit(dimension, [session['data']], int(session['min_confidence']), int(session['max_confidence']),
+                       options=options)
+
+
+def sampling_options(size, error, by):
+    '''
+    Returns the sampling options (see sampling.approximate) from the values of the form, or None if neither the
+    sample size nor the error were given.
+    '''
+
+    if size:
+        options = {"size": int(size)}
+    elif error:
+        options = {"error": float(error)}
+    else:
+        return None
+
+    if by:
+        options["by"] = by
+    return options
+
+
+def report_of(dimension, res):
+    '''
+    Returns the results of a dimension as a list of (name of the rule, rules), for all.html.
+    '''
+
+    if not isinstance(res, tuple):
+        res = (res,)
+    return [(name, rules if len(rules) > 0 else ["No results available."])
+            for name, rules in zip(RULES[dimension], res)]
+
+
+def job_results(dimension):
+    '''
+    Returns the results of the dimension if they are ready, or None after submitting the job (the page
+    then shows the progress of the job and opens the same route with GET when it is done).
+    '''
+
+    job_id = session['job'] = submit_job(dimension)
+    return jobs.result(job_id)
+
+
+def job_stream(dimension, sampled=True):
+    '''
+    Same as job_results, but the results are generators of the rules (see JobManager.iter_result), to show them
+    one page at a time (see rule_page).
+    '''
+
+    job_id = session['job'] = submit_job(dimension, sampled)
+    return jobs.iter_result(job_id)
+
+
+def rule_page(rules):
+    '''
+    Returns the rules of the page asked in the query string (page, from 1, and sort, one of SORTS) from an iterable
+    of rules, and the information shown by pager.html. Only the rules up to the end of the page are kept: in the
+    order they were generated the next rules aren't even read, and sorted by percentage only the best ones are
+    kept while reading them (see top_rules).
+    '''
+
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+    except ValueError:
+        page = 1
+    sort = request.args.get('sort', 'generated')
+    if sort not in SORTS:
+        sort = 'generated'
+
+    end = page * PAGE_SIZE + 1  # one more rule, to know if there is a next page
+    if sort == 'generated':
+        rules = list(islice(rules, end))
+    else:
+        rules = top_rules(rules, end, largest=(sort == 'score-desc'))
+
+    pager = {"page": page, "sort": sort, "sorts": SORTS, "next": len(rules) == end, "first": (page - 1) * PAGE_SIZE + 1}
+    return rules[(page - 1) * PAGE_SIZE:page * PAGE_SIZE], pager
+
+
+def sorted_rules(rules, sort):
+    '''
+    Returns a list of the rules in the order of sort (one of SORTS), the order of the numbers shown by rule_page.
+    '''
+
+    if sort not in SORTS or sort == 'generated':
+        return list(rules)
+    return top_rules(rules, len(rules), largest=(sort == 'score-desc'))
+
+
+def job_page(dimension):
+    return render_template("job.html", jobs=[(dimension, session['job'])], title=dimension.capitalize())
+
+
+def rule_id_of(rules, rule_number, first=1):
+    '''
+    Returns the id of the rule with the number shown in the page, or None if there is no such rule. The rules of
+    the page are numbered from first (see rule_page).
+    '''
+
+    try:
+        rule = rules[int(rule_number) - first] if int(rule_number) >= first else None
+    except (TypeError, ValueError, IndexError):
+        return None
+    return getattr(rule, 'id', None)  # "No results available." isn't a rule
+
+
+def chosen_rule(dimension):
+    '''
+    Returns the rule chosen in a fix_with page, found by its id (kept in the session) in the result cache, without
+    computing the dimension again. If the results are no longer in memory, the dimension is computed again.
+    '''
+
+    rule = results.rule(session.get('rule_id'))
+    if rule is None:
+        results.compute(dimension, [load_data()], int(session['min_confidence']), int(session['max_confidence']))
+        rule = results.rule(session.get('rule_id'))
+    if rule is None:
+        abort(400)
+    return rule
+
+
+def imputer_report(rule):
+    '''
+    Returns the times and accuracy of the models tried to fix the rule (see cleansing.train_imputer), from the cache
+    of models.
+    '''
+
+    imputer = models.get(model_key(models, session['data'], rule, session.get('imputer', IMPUTER)))
+    return imputer.report if imputer is not None else []
+
+
+# names of the rules of each dimension, in the order of the results
+RULES = {
+    "integrity": ["INTE1 | Field has certain value(s)", "INTE2 | Field compares to another Field"],
+    "completeness": ["COMP1 | Field is populated",
+                     "COMP2 | When field has a certain value, then another field is populated",
+                     "COMP3 | When one field is populated, then another field is populated"],
+    "consistency": ["CONS1 | When field has certain value, then another field has another value"],
+    "uniqueness": ["UNIQ1 | Field is unique", "UNIQ2 | Combination of fields is unique"],
+    "relevancy": ["REL1 | All records in one table exist in the other",
+                  "REL2 | When field has a certain value, then its records exist in the other table"],
+    "conformity": ["CONF1 | Field has a certain pattern",
+                   "CONF2 | When one field has a certain value, then another field has a certain pattern",
+                   "CONF3 | Field length ranges between two measures",
+                   "CONF4 | Field value ranges between two other values",
+                   "CONF5 | Field contains a certain datatype"],
+}
+
 
 @app.route('/', methods=['GET','POST'])
 @app.route('/home',methods=['GET','POST'])
@@ -29,19 +216,21 @@ def insertData():
     if request.method == "POST":
 
         file = request.files["file"]
-        df = pd.read_csv(file)
-        dict_obj = df.to_dict('list')
-        session['data'] = dict_obj
+        dataset_id, version, summary = store.put_csv(file)  # read in chunks, the file can be larger than memory
+        session['data'] = (dataset_id, version)
+
+        # the rules that only need the summary of the columns are ready when the upload finishes
+        comp1, conf3, conf4 = summary_rules(summary, 0, 100)
 
-        return render_template("insertData.html", message="Your file was uploaded sucessfully!")
+        return render_template("insertData.html", message="Your file was uploaded sucessfully!",
+                               summary=summary, comp1=comp1, conf3=conf3, conf4=conf4)
     
     return render_template("insertData.html", message="Upload")
 
 
 @app.route('/choice1', methods=['GET','POST'])
 def choice1(): # choose analyze or correct
-    dict_obj = session['data'] if 'data' in session else ""  
-    df = pd.DataFrame(dict_obj)
+    df = load_data()
     return render_template("choice1.html", data=df)
 
 
@@ -58,18 +247,66 @@ def analyze():
         session['min_confidence'] = min
         session['max_confidence'] = max
 
+        # optional sampling of the rows: sample size or error (+- percentage points), stratified by a column
+        session['sampling'] = sampling_options(request.form.get('sample'), request.form.get('error'),
+                                               request.form.get('stratify'))
+
         return render_template("analyze.html", message="Min value set to " + str(session['min_confidence']) +" and max value set to "+str(session['max_confidence'])+".")
     
     session['min_confidence'] = 0
     session['max_confidence'] = 100
+    session['sampling'] = None
     
     return render_template("analyze.html", message="Min value set to None and max value set to None.")
 
+@app.route('/analyze_all', methods=['GET', 'POST'])
+def analyze_all():
+    # all the dimensions run at the same time, divided between the workers of the pool
+    other = [session['data2']] if 'data2' in session else None
+    ids = jobs.submit_all([session['data']], int(session['min_confidence']), int(session['max_confidence']), other,
+                          options=session.get('sampling'))
+
+    res = {dimension: jobs.result(job_id) for dimension, job_id in ids.items()}
+    if any(r is None for r in res.values()):
+        return render_template("job.html", jobs=list(ids.items()), title="All dimensions")
+
+    report = [(dimension, report_of(dimension, r)) for dimension, r in res.items()]
+
+    return render_template("all.html", report=report)
+
+
+@app.route('/verify', methods=['GET', 'POST'])
+def verify():
+    # the rules of the last dimension, found in a sample, are computed again with all the rows
+    job_id = session.get('job')
+    if job_id is None:  # no dimension was run in this session
+        abort(404)
+
+    try:
+        if session.get('verified_job') != job_id:
+            status = jobs.status(job_id)
+            if status['status'] != 'done':  # the page of the dimension shows the progress of the job
+                return redirect(url_for(status['dimension'] + '_page'))
+            session['verification'] = jobs.verify(job_id)
+            session['verified_job'] = job_id
+
+        dimension = jobs.status(session['verification'])['dimension']
+        res = jobs.result(session['verification'])
+    except KeyError:  # the jobs were forgotten (see JobManager), for example after a restart
+        abort(404)
+
+    if res is None:
+        return render_template("job.html", jobs=[(dimension, session['verification'])], title="Verification")
+
+    return render_template("all.html", report=[(dimension, report_of(dimension, res))])
+
+
 @app.route('/integrity', methods=['GET', 'POST'])
 def integrity_page():
-    dict_obj = session['data'] if 'data' in session else ""  
-    df = pd.DataFrame(dict_obj)
-    res1,res2 = integrity(df, int(session['min_confidence']), int(session['max_confidence']))
+    res = job_results("integrity")
+    if res is None:
+        return job_page("integrity")
+    res1,res2 = res
 
     if len(res1)==0:
         res1.append("No results available.")
@@ -82,9 +319,10 @@ def integrity_page():
 
 @app.route('/completeness', methods=['GET', 'POST'])
 def completeness_page():
-    dict_obj = session['data'] if 'data' in session else ""  
-    df = pd.DataFrame(dict_obj)
-    res1,res2,res3 = completeness(df, int(session['min_confidence']), int(session['max_confidence']))
+    res = job_results("completeness")
+    if res is None:
+        return job_page("completeness")
+    res1,res2,res3 = res
 
     if len(res1)==0:
         res1.append("No results available.")
@@ -100,21 +338,23 @@ def completeness_page():
 
 @app.route('/consistency', methods=['GET', 'POST'])
 def consistency_page():
-    dict_obj = session['data'] if 'data' in session else ""  
-    df = pd.DataFrame(dict_obj)
-    res1 = consistency(df, int(session['min_confidence']), int(session['max_confidence']))
+    rules = job_stream("consistency")
+    if rules is None:
+        return job_page("consistency")
+    res1, pager = rule_page(rules)
 
     if len(res1)==0:
         res1.append("No results available.")
 
-    return render_template("consistency.html", res1 = res1)
+    return render_template("consistency.html", res1 = res1, pager=pager)
 
 
 @app.route('/uniqueness', methods=['GET', 'POST'])
 def uniqueness_page():
-    dict_obj = session['data'] if 'data' in session else ""  
-    df = pd.DataFrame(dict_obj)
-    res1,res2 = uniqueness(df, int(session['min_confidence']), int(session['max_confidence']))
+    res = job_results("uniqueness")
+    if res is None:
+        return job_page("uniqueness")
+    res1,res2 = res
 
     if len(res1)==0:
         res1.append("No results available.")
@@ -130,9 +370,8 @@ def relevancy_insertData():
     if request.method == "POST":
 
         file = request.files["file2"]
-        df = pd.read_csv(file)
-        dict_obj = df.to_dict('list')
-        session['data2'] = dict_obj
+        dataset_id, version, summary = store.put_csv(file)
+        session['data2'] = (dataset_id, version)
 
         return render_template("relevancy1.html", message="success")
     
@@ -141,13 +380,10 @@ def relevancy_insertData():
 
 @app.route('/relevancy', methods=['GET', 'POST'])
 def relevancy_page():
-    dict_obj = session['data'] if 'data' in session else ""  
-    df = pd.DataFrame(dict_obj)
-
-    dict_obj2 = session['data2'] if 'data2' in session else ""  
-    df2 = pd.DataFrame(dict_obj2)
-
-    res1,res2 = relevancy(df,df2, "table1", "table2", int(session['min_confidence']), int(session['max_confidence']))
+    res = job_results("relevancy")
+    if res is None:
+        return job_page("relevancy")
+    res1,res2 = res
 
     if len(res1)==0:
         res1.append("No results available.")
@@ -160,9 +396,12 @@ def relevancy_page():
 
 @app.route('/conformity', methods=['GET', 'POST'])
 def conformity_page():
-    dict_obj = session['data'] if 'data' in session else ""  
-    df = pd.DataFrame(dict_obj)
-    res1,res2,res3,res4,res5 = conformity(df, int(session['min_confidence']), int(session['max_confidence']))
+    res = job_stream("conformity")
+    if res is None:
+        return job_page("conformity")
+    res1,res2,res3,res4,res5 = res
+    res1,res3,res4,res5 = list(res1), list(res3), list(res4), list(res5)
+    res2, pager = rule_page(res2)
 
     if len(res1)==0:
         res1.append("No results available.")
@@ -180,7 +419,54 @@ def conformity_page():
         res5.append("No results available.")
 
 
-    return render_template("conformity.html", res1 = res1, res2= res2, res3=res3, res4=res4, res5=res5)
+    return render_template("conformity.html", res1 = res1, res2= res2, res3=res3, res4=res4, res5=res5, pager=pager)
+
+
+def rule_record(rule):
+    '''
+    Returns a rule as a dictionary that can be sent as JSON (the values are sent as text).
+    '''
+
+    return {"id": rule.id, "type": rule.rule_type, "columns": [str(column) for column in rule.columns],
+            "values": [str(value) for value in rule.values],
+            "score": None if rule.score is None else float(rule.score), "text": str(rule)}
+
+
+@app.route('/jobs/<dimension>', methods=['POST'])
+def job_submit(dimension):
+    if dimension not in DIMENSIONS:
+        abort(404)
+    return jsonify(jobs.status(submit_job(dimension)))
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    try:
+        return jsonify(jobs.status(job_id))
+    except KeyError:
+        abort(404)
+
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    try:
+        res = jobs.result(job_id)
+    except KeyError:
+        abort(404)
+
+    if res is None:
+        return jsonify(jobs.status(job_id)), 409
+    if not isinstance(res, tuple):
+        res = (res,)
+    return jsonify({"job": job_id, "results": [[rule_record(rule) for rule in rules] for rules in res]})
+
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def job_cancel(job_id):
+    try:
+        return jsonify(jobs.cancel(job_id))
+    except KeyError:
+        abort(404)
 
 
 @app.route('/correct', methods=['GET','POST'])
@@ -196,19 +482,22 @@ def correct():
         session['min_confidence'] = min
         session['max_confidence'] = max
 
-        return render_template("correct.html", message="Min value set to " + str(session['min_confidence']) +" and max value set to "+str(session['max_confidence'])+".")
+        imputer = request.form.get('imputer')
+        if imputer in IMPUTERS or imputer == "auto":
+            session['imputer'] = imputer
+
+        return render_template("correct.html", imputers=IMPUTERS, chosen=session.get('imputer', IMPUTER), message="Min value set to " + str(session['min_confidence']) +" and max value set to "+str(session['max_confidence'])+".")
     
     session['min_confidence'] = 0
     session['max_confidence'] = 100
     
-    return render_template("correct.html", message="Min value set to None and max value set to None.")
+    return render_template("correct.html", imputers=IMPUTERS, chosen=session.get('imputer', IMPUTER), message="Min value set to None and max value set to None.")
 
 
 @app.route('/fix_with_completeness', methods=['GET','POST'])
 def fix_with_completeness():
-    dict_obj = session['data'] if 'data' in session else ""  
-    df = pd.DataFrame(dict_obj)
-    res1,res2,res3 = completeness(df, int(session['min_confidence']), int(session['max_confidence']))
+    df = load_data()
+    res1,res2,res3 = results.compute(completeness, [df], int(session['min_confidence']), int(session['max_confidence']))
 
     if len(res1)==0:
         res1.append("No results available.")
@@ -222,6 +511,9 @@ def fix_with_completeness():
     if request.method=="POST":
         rule_number = request.form.get('rule_number')
         session['rule_number'] = rule_number
+        session['rule_id'] = rule_id_of(res1, rule_number)
+        if session['rule_id'] is None:
+            return render_template('fix_with_completeness.html', res1=res1,res2=res2,res3=res3, message="There is no rule number "+str(rule_number)+".")
         return render_template('fix_with_completeness.html', res1=res1,res2=res2,res3=res3, message="Rule number set to "+str(session['rule_number'])+".")
     
     
@@ -231,25 +523,24 @@ def fix_with_completeness():
 @app.route('/completeness_results',methods=['GET','POST'])
 def completeness_results():
 
-    dict_obj = session['data'] if 'data' in session else ""  
-    df = pd.DataFrame(dict_obj)
-    res1,res2,res3 = completeness(df, int(session['min_confidence']), int(session['max_confidence']))
-    
-    rule_number = int(session['rule_number'])-1
-    rule = res1[rule_number]
-    altered_rows, altered_dataframe = cleansing_completeness(df, rule)
+    df = load_data()
+    rule = chosen_rule(completeness)
+    altered_rows, altered_dataframe = cleansing_completeness(df, rule, models, session['data'],
+                                                             session.get('imputer', IMPUTER))
 
-    dict_obj = altered_dataframe.to_dict('list')
-    session['data_altered'] = dict_obj
+    # new version of the dataset
+    session['data_altered'] = store.put(altered_dataframe, session['data'][0], parent=session['data'][1])
 
-    return render_template('completeness_results.html', rule=rule,altered_rows=altered_rows, altered_dataframe=altered_dataframe)
+    return render_template('completeness_results.html', rule=rule,altered_rows=altered_rows, altered_dataframe=altered_dataframe,
+                           report=imputer_report(rule))
 
 
 @app.route('/fix_with_consistency', methods=['GET','POST'])
 def fix_with_consistency():
-    dict_obj = session['data'] if 'data' in session else ""  
-    df = pd.DataFrame(dict_obj)
-    res1 = consistency(df, int(session['min_confidence']), int(session['max_confidence']))
+    rules = job_stream("consistency", sampled=False)  # the rules that are applied are found with all the rows
+    if rules is None:
+        return job_page("consistency")
+    res1, pager = rule_page(rules)
 
     if len(res1)==0:
         res1.append("No results available.")
@@ -258,36 +549,87 @@ def fix_with_consistency():
     if request.method=="POST":
         rule_number = request.form.get('rule_number')
         session['rule_number'] = rule_number
-        return render_template('fix_with_consistency.html', res1=res1, message="Rule number set to "+str(session['rule_number'])+".")
+        session['rule_id'] = rule_id_of(res1, rule_number, pager['first'])
+        if session['rule_id'] is None:
+            return render_template('fix_with_consistency.html', res1=res1, pager=pager, message="There is no rule number "+str(rule_number)+".")
+        return render_template('fix_with_consistency.html', res1=res1, pager=pager, message="Rule number set to "+str(session['rule_number'])+".")
 
 
 
-    return render_template('fix_with_consistency.html', res1=res1, message="Rule number set to None.")
+    return render_template('fix_with_consistency.html', res1=res1, pager=pager, message="Rule number set to None.")
 
 
 @app.route('/consistency_results',methods=['GET','POST'])
 def consistency_results():
 
-    dict_obj = session['data'] if 'data' in session else ""  
-    df = pd.DataFrame(dict_obj)
-    res1 = consistency(df, int(session['min_confidence']), int(session['max_confidence']))
-    
-    rule_number = int(session['rule_number'])-1
-    rule = res1[rule_number]
-    altered_rows, altered_dataframe = cleansing_consistency(df, rule)
+    df = load_data()
+    rule = chosen_rule(consistency)
+    altered_rows, altered_dataframe = cleansing_consistency(df, rule, models, session['data'],
+                                                            session.get('imputer', IMPUTER))
+
+    # new version of the dataset
+    session['data_altered'] = store.put(altered_dataframe, session['data'][0], parent=session['data'][1])
+
+    return render_template('consistency_results.html', rule=rule,altered_rows=altered_rows, altered_dataframe=altered_dataframe,
+                           report=imputer_report(rule))
+
+
+def batch_rules(res, numbers):
+    '''
+    Returns the rules of res with the numbers shown in a fix_with page ("1, 4, 7"), found by their ids in the
+    result cache, or None if one of the numbers isn't a rule.
+    '''
+
+    rules = []
+    for rule_number in numbers.replace(",", " ").split():
+        rule = results.rule(rule_id_of(res, rule_number))
+        if rule is None:
+            return None
+        rules.append(rule)
+    return rules
+
+
+@app.route('/batch_results', methods=['GET','POST'])
+def batch_results():
+    '''
+    Applies many completeness (COMP1) and consistency rules at once: the numbers of the rules are in the fields
+    completeness_rules and consistency_rules of the form. The consistency rules are numbered in the order of the
+    sort in the query string, as in their pages (see rule_page).
+    '''
+
+    df = load_data()
+    min_perc, max_perc = int(session['min_confidence']), int(session['max_confidence'])
+
+    rules = []
+    for dimension, field in ((completeness, 'completeness_rules'), (consistency, 'consistency_rules')):
+        if request.form.get(field):
+            res = results.compute(dimension, [df], min_perc, max_perc)
+            res = res[0] if dimension is completeness else sorted_rules(res, request.args.get('sort', 'generated'))
+            chosen = batch_rules(res, request.form[field])
+            if chosen is None:
+                return render_template('correct.html', imputers=IMPUTERS, chosen=session.get('imputer', IMPUTER), message="Not all of "+request.form[field]+" are rule numbers.")
+            rules += chosen
+
+    if not rules:
+        return render_template('correct.html', imputers=IMPUTERS, chosen=session.get('imputer', IMPUTER), message="No rules were chosen.")
+
+    changes, altered_dataframe = cleansing_batch(df, rules, models, session['data'], jobs.executor(),
+                                                 session.get('imputer', IMPUTER))
 
-    dict_obj = altered_dataframe.to_dict('list')
-    session['data_altered'] = dict_obj
+    # new version of the dataset
+    session['data_altered'] = store.put(altered_dataframe, session['data'][0], parent=session['data'][1])
 
-    return render_template('consistency_results.html', rule=rule,altered_rows=altered_rows, altered_dataframe=altered_dataframe)
+    return render_template('batch_results.html', changes=[(rule, altered_rows, imputer_report(rule))
+                                                          for rule, altered_rows in zip(rules, changes)],
+                           altered_dataframe=altered_dataframe)
 
 
 @app.route('/change_original_df', methods=['GET','POST'])
 def change_original_df():
 
-    dict_obj = session['data_altered'] if 'data' in session else ""  
-    df = pd.DataFrame(dict_obj)
-    session['data'] = dict_obj
+    df = load_data('data_altered')
+    session['data'] = session['data_altered']
+    models.forget(session['data'][0], keep=session['data'][1])  # the models of the old versions aren't used
 
     return render_template('change_original_df.html', altered_dataframe = df)
 
@@ -297,8 +639,7 @@ def change_original_df():
 def download():
     if request.method=="POST":
         file_name = request.form.get('file_name')
-        dic = session['data']
-        df = pd.DataFrame(dic)
+        df = load_data()
         df.to_csv(""+file_name+".csv",index=False)
 
     return render_template('download.html')